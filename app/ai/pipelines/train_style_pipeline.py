@@ -3,14 +3,30 @@
 High-level orchestration to create a style profile from sample docs.
 This is lightweight and intended to be launched as a background task.
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.ai.services import StrokeEngine, StyleService
+from app.ai.utils.geometry_utils import save_glyph_geometry
+from app.ai.utils.atlas_utils import write_glyph_atlas
 import asyncio
 
-async def train_style_pipeline(sample_docs: List[Dict[str, Any]]):
+async def train_style_pipeline(
+    sample_docs: List[Dict[str, Any]],
+    geometry_path: Optional[str] = None,
+    atlas_path: Optional[str] = None,
+):
     engine = StrokeEngine()
     style_service = StyleService(engine)
     # Build profile (IO bound)
-    profile = await style_service.build_style_profile(sample_docs)
-    # return profile to caller (DB saving is caller's responsibility)
+    if not (atlas_path or geometry_path):
+        # return profile to caller (DB saving is caller's responsibility)
+        return await style_service.build_style_profile(sample_docs)
+    profile, geometry = await style_service.build_style_profile_with_geometry(sample_docs)
+    # immutable memory-mapped atlas for generation workers
+    if atlas_path:
+        profile["meta"]["atlas_path"] = write_glyph_atlas(
+            atlas_path, profile["character_database"], geometry
+        )
+    # binary glyph geometry goes to an .npz sidecar; the profile keeps its path
+    if geometry_path:
+        profile["meta"]["geometry_path"] = save_glyph_geometry(geometry_path, geometry)
     return profile
@@ -1,10 +1,27 @@
 # generate handwriting by cloning strokes and composing SVG pages
 import os
-import random
-from typing import List, Dict, Any
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
-import svgwrite
+import numpy as np
+from app.ai.utils.svg_utils import write_svg_page
 from app.ai.services.style_service import StyleService
+from app.ai.utils.layout_utils import build_width_table, layout_text
+from app.ai.utils.sampling_utils import build_alias_tables, build_alias_tables_from_weights, sample_variants
+from app.ai.utils.atlas_utils import open_glyph_atlas
+from app.ai.utils.geometry_utils import load_glyph_geometry, points_to_path, variant_points
+
+# shared by every GenerationService, so pipelines that build a service per document reuse them
+_page_executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="svg-page")
+# loaded .npz geometry sidecars, keyed by path
+_geometries: Dict[str, Any] = {}
+# memory-mapped glyph atlases and their tables, keyed by path
+_atlases: Dict[str, Any] = {}
+# glyph width and variant alias tables, keyed by (style id, style version)
+_style_tables: Dict[Tuple[str, str], Any] = {}
+MAX_CACHED_STYLES = 32
 
 class GenerationService:
     def __init__(self, style_service: StyleService, outputs_dir: str = "outputs"):
@@ -13,46 +30,146 @@ class GenerationService:
         os.makedirs(outputs_dir, exist_ok=True)
         self.page_w = 2480
         self.page_h = 3508
+        self.margin_x = 100
+        self.margin_top = 150
+        self.margin_bottom = 150
 
     async def generate_document(self, style_profile: Dict[str, Any], text: str, settings: Dict[str, Any]) -> str:
         """
-        Returns path to saved SVG output
+        Returns path to the first saved SVG page (see generate_document_pages for all pages)
+        """
+        pages = await self.generate_document_pages(style_profile, text, settings)
+        return pages[0]
+
+    async def generate_document_pages(self, style_profile: Dict[str, Any], text: str, settings: Dict[str, Any]) -> List[str]:
         """
-        # Convert text to stroke sequence
+        Lay out text, split it into pages and write one SVG per page.
+        Pages are serialized concurrently on a thread pool.
+        Returns the page paths in order.
+        """
+        # Lay out the whole document in one vectorized pass (word-aware wrapping)
+        # a compiled atlas replaces the character database entirely
         char_db = style_profile.get("character_database", {})
-        x, y = 100, 150  # margins
+        atlas = self._atlas(style_profile.get("meta", {}).get("atlas_path"))
+        if atlas is not None:
+            geometry, (codes, widths, alias_tables) = atlas
+        else:
+            codes, widths, alias_tables = self._tables(style_profile)
         line_height = settings.get("line_height", 80)
-        strokes_to_render = []
-        for ch in text:
-            if ch == "\n":
-                x = 100
-                y += line_height
-                continue
-            if ch.isspace():
-                x += settings.get("space", 40)
-                continue
-            variants = char_db.get(ch)
-            if not variants:
-                x += settings.get("space", 40)
-                continue
-            selected = random.choice(variants["variants"])
+        layout = layout_text(
+            text, codes, widths,
+            line_width=self.page_w - 2 * self.margin_x,
+            space=settings.get("space", 40),
+            letter_spacing=settings.get("letter_spacing", 6),
+        )
+        lines_per_page = max(1, int((self.page_h - self.margin_top - self.margin_bottom) // line_height))
+        drawn = np.flatnonzero(layout["glyph"] >= 0)
+        glyphs = layout["glyph"][drawn]
+        # one weighted draw for every glyph of the document
+        rng = np.random.default_rng(settings.get("seed"))
+        chosen = sample_variants(alias_tables, glyphs, rng).tolist()
+        if atlas is None:
+            geometry = self._geometry(style_profile, codes)
+        lines = layout["line"][drawn]
+        page_of = lines // lines_per_page
+        xs = (self.margin_x + layout["x"][drawn]).tolist()
+        ys = (self.margin_top + (lines % lines_per_page) * line_height).tolist()
+        page_count = int(page_of[-1]) + 1 if len(drawn) else 1
+        # each page lists its distinct glyph variants once (emitted in <defs>) plus placements into them
+        pages = [{"ids": {}, "glyphs": [], "placements": []} for _ in range(page_count)]
+        for i, g, v, page, x, y in zip(drawn.tolist(), glyphs.tolist(), chosen, page_of.tolist(), xs, ys):
             # note: path is assumed to be absolute path coordinates - will translate
-            strokes_to_render.append({"path": selected["path"], "x": x, "y": y, "ch": ch})
-            x += variants.get("avg_width", 40) + settings.get("letter_spacing", 6)
-            if x > self.page_w - 100:
-                x = 100
-                y += line_height
-
-        # render to svg
-        ts = int(datetime.utcnow().timestamp())
-        out_path = os.path.join(self.outputs_dir, f"generated_{ts}.svg")
-        dwg = svgwrite.Drawing(out_path, size=(f"{self.page_w}px", f"{self.page_h}px"))
-        page_group = dwg.g(id="page_0")
-        for s in strokes_to_render:
-            path = dwg.path(d=s["path"], stroke=settings.get("ink_color", "#000"), stroke_width=settings.get("thickness", 2),
-                            fill="none", stroke_linecap="round", stroke_linejoin="round")
-            path.translate(s["x"], s["y"])
-            page_group.add(path)
-        dwg.add(page_group)
-        dwg.save()
+            p = pages[page]
+            gid = p["ids"].get((g, v))
+            if gid is None:
+                gid = p["ids"][(g, v)] = len(p["glyphs"])
+                if geometry is not None:
+                    p["glyphs"].append(points_to_path(variant_points(geometry, g, v)))
+                else:
+                    p["glyphs"].append(char_db[text[i]]["variants"][v]["path"])
+            p["placements"].append((gid, x, y))
+
+        # render each page to its own svg, concurrently
+        stem = f"generated_{int(datetime.utcnow().timestamp())}_{uuid.uuid4().hex[:8]}"
+        out_paths = [
+            os.path.join(self.outputs_dir, f"{stem}_p{n + 1}.svg") for n in range(page_count)
+        ]
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(_page_executor, self._write_page, out_path, n, page, settings)
+            for n, (out_path, page) in enumerate(zip(out_paths, pages))
+        ])
+        return out_paths
+
+    def _write_page(self, out_path: str, page_index: int, page: Dict[str, Any], settings: Dict[str, Any]) -> str:
+        with open(out_path, "wb", buffering=1 << 16) as fh:
+            write_svg_page(
+                fh, page["glyphs"], page["placements"],
+                width=f"{self.page_w}px", height=f"{self.page_h}px",
+                group_id=f"page_{page_index}",
+                stroke=settings.get("ink_color", "#000"),
+                stroke_width=settings.get("thickness", 2),
+            )
         return out_path
+
+    def _geometry(self, style_profile: Dict[str, Any], codes: np.ndarray):
+        """Packed glyph geometry from the profile or its .npz sidecar, if it matches the width table."""
+        geometry = style_profile.get("geometry")
+        if geometry is None:
+            path = style_profile.get("meta", {}).get("geometry_path")
+            if not path:
+                return None
+            geometry = _geometries.get(path)
+            if geometry is None:
+                geometry = _geometries[path] = load_glyph_geometry(path)
+                if len(_geometries) > MAX_CACHED_STYLES:
+                    _geometries.pop(next(iter(_geometries)))
+        if geometry is None or not np.array_equal(geometry["chars"], codes):
+            return None
+        return geometry
+
+    def _atlas(self, path: str):
+        """Mapped atlas and its (codes, widths, alias tables), opened once per path per process."""
+        if not path or not os.path.exists(path):
+            return None
+        cached = _atlases.get(path)
+        if cached is None:
+            atlas = open_glyph_atlas(path)
+            tables = (
+                atlas["chars"],
+                atlas["widths"].astype(np.float64),
+                build_alias_tables_from_weights(atlas["weights"].astype(np.float64), atlas["char_offsets"]),
+            )
+            cached = _atlases[path] = (atlas, tables)
+            if len(_atlases) > MAX_CACHED_STYLES:
+                _atlases.pop(next(iter(_atlases)))
+        return cached
+
+    @staticmethod
+    def _style_key(style_profile: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """(style id, version) of a stored profile; None for an unsaved one."""
+        style_id = style_profile.get("style_id") or style_profile.get("id")
+        if not style_id:
+            return None
+        version = (
+            style_profile.get("version")
+            or style_profile.get("last_retrained_at")
+            or style_profile.get("updated_at")
+            or style_profile.get("created_at", "")
+        )
+        return str(style_id), str(version)
+
+    def _tables(self, style_profile: Dict[str, Any]):
+        """Width table and variant alias tables for a style, built once per style version."""
+        key = self._style_key(style_profile)
+        cached = _style_tables.get(key) if key else None
+        if cached is None:
+            char_db = style_profile.get("character_database", {})
+            codes, widths = build_width_table(char_db)
+            alias_tables = build_alias_tables(char_db, [chr(c) for c in codes.tolist()])
+            cached = (codes, widths, alias_tables)
+            if key:
+                _style_tables[key] = cached
+                if len(_style_tables) > MAX_CACHED_STYLES:
+                    _style_tables.pop(next(iter(_style_tables)))
+        return cached
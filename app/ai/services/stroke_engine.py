@@ -1,9 +1,12 @@
 # stroke extraction using OpenCV contours (no potrace)
 import os
+import asyncio
 from typing import List, Dict, Any, Tuple
 from PIL import Image
 import numpy as np
 import cv2
+from app.ai.utils.geometry_utils import points_to_path
+from app.services.feature_extraction import extract_file_contours, get_feature_pool
 
 
 class StrokeEngine:
@@ -28,35 +31,35 @@ class StrokeEngine:
         return out_path
 
     async def extract_strokes(self, bin_image_path: str) -> List[Dict[str, Any]]:
-        # Use OpenCV contours to approximate strokes from a binarized image
-        img = cv2.imread(bin_image_path, cv2.IMREAD_GRAYSCALE)
-        if img is None:
-            return []
-        # Ensure binary (invert so strokes are white on black for findContours if needed)
-        _, thresh = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        # Invert so contours correspond to ink regions
-        thresh_inv = cv2.bitwise_not(thresh)
-        contours, _ = cv2.findContours(thresh_inv, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        strokes: List[Dict[str, Any]] = []
-        for cnt in contours:
-            if cnt is None or len(cnt) == 0:
-                continue
-            # approximate contour to reduce points
-            epsilon = 0.01 * cv2.arcLength(cnt, True)
-            approx = cv2.approxPolyDP(cnt, epsilon, True)
-            points = [tuple(pt[0]) for pt in approx]
-            if not points:
-                continue
-            # build simple path (M + L commands)
-            path_str = f"M{points[0][0]},{points[0][1]}"
-            for (x, y) in points[1:]:
-                path_str += f" L{x},{y}"
-            x, y, w, h = cv2.boundingRect(cnt)
-            stroke = {
-                "path": path_str,
-                "bbox": (int(x), int(y), int(x + w), int(y + h)),
-                "closed": bool(cv2.isContourConvex(approx)),
-                "segments": len(points)
-            }
-            strokes.append(stroke)
-        return strokes
+        return extract_strokes_from_file(bin_image_path)
+
+    async def extract_strokes_many(self, bin_image_paths: List[str]) -> List[List[Dict[str, Any]]]:
+        """Extract strokes of several samples on the shared feature pool (results in input order)."""
+        if len(bin_image_paths) <= 1:
+            return [extract_strokes_from_file(p) for p in bin_image_paths]
+        pool = get_feature_pool()
+        loop = asyncio.get_running_loop()
+        outlines = await asyncio.gather(*[
+            loop.run_in_executor(pool, extract_file_contours, p) for p in bin_image_paths
+        ])
+        return [_to_strokes(o) for o in outlines]
+
+
+def extract_strokes_from_file(bin_image_path: str) -> List[Dict[str, Any]]:
+    # contours of the ink regions, approximated to reduce points
+    return _to_strokes(extract_file_contours(bin_image_path))
+
+
+def _to_strokes(outlines: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    strokes: List[Dict[str, Any]] = []
+    for outline in outlines:
+        points = outline["points"]
+        strokes.append({
+            # simple path (M + L commands) for svg output; points keep the raw geometry
+            "path": points_to_path(points),
+            "points": points,
+            "bbox": outline["bbox"],
+            "closed": outline["closed"],
+            "segments": len(points)
+        })
+    return strokes
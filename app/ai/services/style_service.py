@@ -1,8 +1,10 @@
 # style creation (character stroke DB + simple stats)
 import json
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from app.ai.services.stroke_engine import StrokeEngine
+from app.ai.utils.geometry_utils import join_subpaths, pack_glyph_geometry
+from app.utils.align import align_components, group_by_character
 
 class StyleService:
     def __init__(self, stroke_engine: StrokeEngine):
@@ -11,27 +13,41 @@ class StyleService:
     async def build_style_profile(self, sample_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         sample_docs: list of dicts with keys { 'processed_path', 'transcript', 'user_id' }
-        Return: style_profile dict (character -> variants)
+        Return: json-serializable style_profile dict (character -> variants)
         """
+        profile, _ = await self.build_style_profile_with_geometry(sample_docs)
+        return profile
+
+    async def build_style_profile_with_geometry(
+        self, sample_docs: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """Same as build_style_profile, plus the packed binary glyph geometry (kept out of the profile)."""
         char_db = {}
-        for sample in sample_docs:
-            processed = sample.get("processed_path")
+        points = {}
+        # contour extraction is CPU bound: fan samples out over worker processes
+        all_strokes = await self.stroke_engine.extract_strokes_many([s.get("processed_path") for s in sample_docs])
+        for sample, strokes in zip(sample_docs, all_strokes):
             transcript = sample.get("transcript", "")
-            strokes = await self.stroke_engine.extract_strokes(processed)
-            # naive mapping: equal partitioning (improve later with alignment)
-            chars = [c for c in transcript]
             if not strokes:
                 continue
-            per = max(1, len(strokes) // max(1, len(chars)))
-            for i, ch in enumerate(chars):
-                if ch.isspace(): continue
-                idx = min(len(strokes)-1, i*per)
-                entry = {"path": strokes[idx]["path"], "bbox": strokes[idx]["bbox"]}
+            # align components to the transcript in reading order; a character may span several components
+            order, char_index = align_components([st["bbox"] for st in strokes], transcript)
+            for ch, comps in group_by_character(order, char_index, transcript):
+                parts = [strokes[c] for c in comps]
+                boxes = np.array([st["bbox"] for st in parts])
+                entry = {
+                    "path": " ".join(st["path"] for st in parts),
+                    "bbox": (int(boxes[:, 0].min()), int(boxes[:, 1].min()), int(boxes[:, 2].max()), int(boxes[:, 3].max())),
+                }
                 char_db.setdefault(ch, {"variants": []})["variants"].append(entry)
+                points.setdefault(ch, []).append(join_subpaths([st["points"] for st in parts]))
         # compute averages
         for ch, data in char_db.items():
             variants = data["variants"]
             data["avg_width"] = float(np.mean([ (v["bbox"][2]-v["bbox"][0]) if v["bbox"] else 0 for v in variants ])) if variants else 0
             data["avg_height"] = float(np.mean([ (v["bbox"][3]-v["bbox"][1]) if v["bbox"] else 0 for v in variants ])) if variants else 0
-        profile = {"character_database": char_db, "meta": {"num_chars": len(char_db)}}
-        return profile
+        profile = {
+            "character_database": char_db,
+            "meta": {"num_chars": len(char_db)},
+        }
+        return profile, pack_glyph_geometry(char_db, points)
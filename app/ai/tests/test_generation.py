@@ -23,3 +23,102 @@ async def test_generate_document(tmp_path):
     out = await gen.generate_document(style_profile, "Hi Hi\nHi", {"ink_color":"#123456", "thickness":1})
     assert out.endswith(".svg")
     assert os.path.exists(out)
+
+def test_layout_wraps_between_words():
+    from app.ai.utils.layout_utils import build_width_table, layout_text
+    char_db = {c: {"variants": [{"path": "M0,0"}], "avg_width": 10} for c in "abcdefghijklmnopqrstuvwxyz"}
+    codes, widths = build_width_table(char_db)
+    text = "hello world foo\n\nbar"
+    layout = layout_text(text, codes, widths, line_width=100, space=5, letter_spacing=2)
+    lines = {text[i]: int(layout["line"][i]) for i in (0, 6, 12, 17)}
+    assert lines == {"h": 0, "w": 1, "f": 2, "b": 4}
+    # words never straddle lines
+    assert layout["x"][6] == 0
+
+@pytest.mark.asyncio
+async def test_generate_document_splits_pages(tmp_path):
+    style_profile = {"character_database": {"a": {"variants": [{"path": "M0,0 L10,0"}], "avg_width": 10}}}
+    gen = GenerationService(StyleService(StrokeEngine(tmp_path)), outputs_dir=str(tmp_path))
+    # 80px lines, (3508 - 300) // 80 = 40 lines per page
+    pages = await gen.generate_document_pages(style_profile, "\n".join(["a"] * 100), {})
+    assert len(pages) == 3
+    assert all(os.path.exists(p) for p in pages)
+    page = open(pages[2]).read()
+    assert page.count("<use") == 20 and page.count("<path") == 1
+
+@pytest.mark.asyncio
+async def test_generate_pipeline_returns_every_page(tmp_path, monkeypatch):
+    from app.ai.pipelines.generate_pipeline import generate_pipeline
+    monkeypatch.chdir(tmp_path)
+    style_profile = {"character_database": {"a": {"variants": [{"path": "M0,0 L10,0"}], "avg_width": 10}}}
+    pages = await generate_pipeline(style_profile, "\n".join(["a"] * 100), {})
+    assert len(pages) == 3 and all(os.path.exists(p) for p in pages)
+
+def test_svg_page_dedupes_glyphs():
+    import io
+    import xml.etree.ElementTree as ET
+    from app.ai.utils.svg_utils import write_svg_page
+    out = io.BytesIO()
+    placements = [(0, 112.5, 150.0), (1, 128.0, 150.0), (0, 140.0, 230.0)]
+    write_svg_page(out, ["M0,0 L10,0", "M0,0 L2,0"], placements, "2480px", "3508px",
+                   group_id="page_1", stroke="#123", stroke_width=3, chunk_size=1)
+    root = ET.fromstring(out.getvalue())
+    ns = "{http://www.w3.org/2000/svg}"
+    defs = root.findall(f"{ns}defs/{ns}path")
+    assert [p.get("id") for p in defs] == ["g0", "g1"]
+    group = root.find(f"{ns}g")
+    assert group.get("id") == "page_1" and group.get("stroke") == "#123"
+    uses = group.findall(f"{ns}use")
+    assert [u.get("href") for u in uses] == ["#g0", "#g1", "#g0"]
+    assert uses[2].get("transform") == "translate(140.0,230.0)"
+
+def test_alias_sampling_respects_frequencies():
+    import numpy as np
+    from app.ai.utils.sampling_utils import build_alias_tables, sample_variants
+    char_db = {
+        "a": {"variants": [{"frequency": 1.0}, {"frequency": 3.0}, {"frequency": 0.0}]},
+        "b": {"variants": [{}]},
+    }
+    tables = build_alias_tables(char_db, ["a", "b"])
+    glyph = np.array([0] * 40000 + [1] * 100)
+    chosen = sample_variants(tables, glyph, np.random.default_rng(7))
+    counts = np.bincount(chosen[:40000], minlength=3) / 40000
+    assert abs(counts[0] - 0.25) < 0.02 and abs(counts[1] - 0.75) < 0.02 and counts[2] == 0
+    assert (chosen[40000:] == 0).all()
+    # same seed, same document
+    assert (sample_variants(tables, glyph, np.random.default_rng(7)) == chosen).all()
+
+def test_style_tables_cached_per_style_version(tmp_path):
+    char_db = {"a": {"variants": [{"path": "M0,0 L10,0"}], "avg_width": 10}}
+    gen = GenerationService(StyleService(StrokeEngine(tmp_path)), outputs_dir=str(tmp_path))
+    # every request loads a fresh profile dict; the tables are still built once per version
+    first = gen._tables({"style_id": "s1", "version": 1, "character_database": dict(char_db)})
+    again = gen._tables({"style_id": "s1", "version": 1, "character_database": dict(char_db)})
+    retrained = gen._tables({"style_id": "s1", "version": 2, "character_database": dict(char_db)})
+    assert again is first and retrained is not first
+
+@pytest.mark.asyncio
+async def test_generate_from_memory_mapped_atlas(tmp_path):
+    import numpy as np
+    from app.ai.utils.atlas_utils import open_glyph_atlas, write_glyph_atlas
+    char_db = {
+        "a": {"variants": [{"path": "M0,0 L10,0", "bbox": [0, 0, 10, 2]}, {"path": "M0,0 L10,5", "frequency": 0.0}], "avg_width": 10},
+        "b": {"variants": [{"path": "M1,1 L2,8"}], "avg_width": 4},
+    }
+    path = write_glyph_atlas(str(tmp_path / "style"), char_db)
+    atlas = open_glyph_atlas(path)
+    assert isinstance(atlas["points"], np.memmap)
+    assert atlas["chars"].tolist() == [ord("a"), ord("b")]
+    assert atlas["weights"].tolist() == [1.0, 0.0, 1.0]
+    assert atlas["points"][atlas["variant_offsets"][2]:].tolist() == [[1, 1], [2, 8]]
+    assert not atlas["points"].flags.writeable
+
+    # generation reads everything from the atlas, not the character database
+    gen = GenerationService(StyleService(StrokeEngine(tmp_path)), outputs_dir=str(tmp_path))
+    profile = {"character_database": {}, "meta": {"atlas_path": path}}
+    pages = await gen.generate_document_pages(profile, "ab a", {})
+    svg = open(pages[0]).read()
+    assert svg.count("<use") == 3 and "M0,0 L10,0" in svg and "M1,1 L2,8" in svg and "L10,5" not in svg
+    # a new service per document (as generate_pipeline does) reuses the mapped atlas
+    other = GenerationService(StyleService(StrokeEngine(tmp_path)), outputs_dir=str(tmp_path))
+    assert other._atlas(path) is gen._atlas(path)
@@ -20,3 +20,25 @@ async def test_extract_strokes(tmp_path):
     # we expect at least one stroke in the result
     assert isinstance(strokes, list)
     assert len(strokes) >= 1
+
+@pytest.mark.asyncio
+async def test_extract_strokes_many_matches_sequential(tmp_path):
+    paths = []
+    for n in range(3):
+        p = tmp_path / f"s{n}.png"
+        img = Image.new("L", (200, 100), 255)
+        ImageDraw.Draw(img).line((10, 20 + 20 * n, 190, 20 + 20 * n), fill=0, width=5)
+        img.save(p)
+        paths.append(str(p))
+
+    engine = StrokeEngine(tmp_dir=str(tmp_path))
+    parallel = await engine.extract_strokes_many(paths)
+    for path, strokes in zip(paths, parallel):
+        expected = await engine.extract_strokes(path)
+        assert [s["path"] for s in strokes] == [s["path"] for s in expected]
+    # engines extract on the process-wide feature pool instead of starting their own
+    from app.services.feature_extraction import get_feature_pool
+    pool = get_feature_pool()
+    again = StrokeEngine(tmp_dir=str(tmp_path))
+    await again.extract_strokes_many(paths)
+    assert get_feature_pool() is pool
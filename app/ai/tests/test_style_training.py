@@ -23,3 +23,69 @@ async def test_build_style_profile(tmp_path):
     assert "character_database" in profile
     # 'a' or 'b' or 'c' may be present depending on potrace output but structure should be dict
     assert isinstance(profile["character_database"], dict)
+    # without a sidecar the profile stays json-serializable
+    assert "geometry" not in profile
+    json.dumps(profile)
+
+@pytest.mark.asyncio
+async def test_profile_geometry_sidecar(tmp_path):
+    from app.ai.pipelines.train_style_pipeline import train_style_pipeline
+    from app.ai.utils.geometry_utils import load_glyph_geometry, points_to_path, variant_points
+    p1 = tmp_path / "s1_proc.png"
+    img = Image.new("RGB", (200, 100), "white")
+    draw = ImageDraw.Draw(img)
+    draw.line((10, 50, 60, 50), fill="black", width=5)
+    draw.line((100, 20, 100, 80), fill="black", width=5)
+    img.save(p1)
+
+    sample_docs = [{"processed_path": str(p1), "transcript": "ab", "user_id": "u1"}]
+    profile = await train_style_pipeline(sample_docs, geometry_path=str(tmp_path / "style"))
+    assert "geometry" not in profile
+    json.dumps(profile)
+    geometry = load_glyph_geometry(profile["meta"]["geometry_path"])
+    assert geometry["points"].dtype == "float32"
+    chars = [chr(c) for c in geometry["chars"]]
+    for g, ch in enumerate(chars):
+        for v, variant in enumerate(profile["character_database"][ch]["variants"]):
+            assert points_to_path(variant_points(geometry, g, v)) == variant["path"]
+
+def _page_boxes(lines, glyph_w=18, narrow="iltf", seed=0):
+    """Synthetic components for lines of text (i gets a dot), shuffled; returns boxes and true transcript indices."""
+    import numpy as np
+    boxes, truth, pos = [], [], 0
+    for li, line in enumerate(lines):
+        x = 10
+        for ch in line:
+            if ch != " ":
+                w = 8 if ch in narrow else glyph_w
+                boxes.append([x, 100 * li + 20, x + w, 100 * li + 50]); truth.append(pos)
+                if ch == "i":
+                    boxes.append([x + 1, 100 * li + 8, x + 6, 100 * li + 14]); truth.append(pos)
+                x += w + 4
+            else:
+                x += 18
+            pos += 1
+        pos += 1
+    perm = np.random.default_rng(seed).permutation(len(boxes))
+    return np.array(boxes)[perm], np.array(truth)[perm]
+
+def test_align_components_reading_order_and_dots():
+    from app.utils.align import align_components, group_by_character
+    lines = ["this is fine", "and it aligns"]
+    boxes, truth = _page_boxes(lines)
+    transcript = "\n".join(lines)
+    order, char_index = align_components(boxes, transcript)
+    assert (char_index == truth[order]).all()
+    groups = group_by_character(order, char_index, transcript)
+    assert [ch for ch, _ in groups] == [ch for ch in transcript if not ch.isspace()]
+    assert [len(c) for ch, c in groups if ch == "i"] == [2] * 5
+
+def test_align_components_full_page_is_fast():
+    import time
+    from app.utils.align import align_components
+    lines = [" ".join(["word"] * 20)] * 75  # 6000 components
+    boxes, truth = _page_boxes(lines)
+    start = time.perf_counter()
+    order, char_index = align_components(boxes, "\n".join(lines))
+    assert time.perf_counter() - start < 1.0
+    assert (char_index == truth[order]).mean() > 0.99
@@ -0,0 +1,82 @@
+# app/ai/utils/atlas_utils.py
+import os
+import struct
+import tempfile
+from typing import Dict, Any, Optional
+import numpy as np
+from app.ai.utils.geometry_utils import pack_glyph_geometry
+
+ATLAS_MAGIC = b"WGATLAS1"
+ATLAS_SUFFIX = ".atlas"
+HEADER_SIZE = 64
+ALIGN = 64
+# fixed section order; every section is little-endian and starts on a 64-byte boundary.
+# C = characters, V = variants, N = points
+SECTIONS = (
+    ("chars", "<u4", lambda c, v, n: (c,)),
+    ("widths", "<f4", lambda c, v, n: (c,)),
+    ("char_offsets", "<i8", lambda c, v, n: (c + 1,)),
+    ("weights", "<f4", lambda c, v, n: (v,)),
+    ("bbox", "<f4", lambda c, v, n: (v, 4)),
+    ("variant_offsets", "<i8", lambda c, v, n: (v + 1,)),
+    ("points", "<f4", lambda c, v, n: (n, 2)),
+)
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_glyph_atlas(
+    path: str, char_db: Dict[str, Any], geometry: Optional[Dict[str, np.ndarray]] = None, default_width: float = 40
+) -> str:
+    """
+    Compile a style into one immutable atlas file (written atomically).
+    Holds the packed geometry plus per-character widths and per-variant weights,
+    in the same order as the layout width table.
+    """
+    if not path.endswith(ATLAS_SUFFIX):
+        path += ATLAS_SUFFIX
+    geometry = geometry or pack_glyph_geometry(char_db)
+    chars = [chr(c) for c in geometry["chars"].tolist()]
+    arrays = dict(geometry)
+    arrays["widths"] = np.array([char_db[ch].get("avg_width", default_width) for ch in chars], dtype=np.float32)
+    arrays["weights"] = np.array(
+        [v.get("frequency", 1.0) for ch in chars for v in char_db[ch]["variants"]], dtype=np.float32
+    )
+    c, v, n = len(chars), len(arrays["weights"]), len(arrays["points"])
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(struct.pack("<8sQQQ", ATLAS_MAGIC, c, v, n).ljust(HEADER_SIZE, b"\0"))
+            for name, dtype, shape in SECTIONS:
+                f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+                f.write(np.ascontiguousarray(arrays[name], dtype=dtype).reshape(shape(c, v, n)).tobytes())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+
+def open_glyph_atlas(path: str) -> Dict[str, np.ndarray]:
+    """
+    Map an atlas file read-only. Every array is a view into one shared np.memmap,
+    so processes opening the same atlas share its pages through the OS page cache.
+    Keys match pack_glyph_geometry, plus 'widths' and 'weights'.
+    """
+    buf = np.memmap(path, dtype=np.uint8, mode="r")
+    magic, c, v, n = struct.unpack_from("<8sQQQ", buf[:32].tobytes())
+    if magic != ATLAS_MAGIC:
+        raise ValueError(f"Not a glyph atlas: {path}")
+    atlas = {}
+    offset = HEADER_SIZE
+    for name, dtype, shape in SECTIONS:
+        offset = _aligned(offset)
+        dims = shape(c, v, n)
+        size = int(np.prod(dims)) * np.dtype(dtype).itemsize
+        atlas[name] = buf[offset:offset + size].view(dtype).reshape(dims)
+        offset += size
+    return atlas
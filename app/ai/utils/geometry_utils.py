@@ -0,0 +1,98 @@
+# app/ai/utils/geometry_utils.py
+import os
+import re
+from typing import Dict, Any, List, Optional
+import numpy as np
+
+GEOMETRY_SUFFIX = ".glyphs.npz"
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def points_to_path(points: np.ndarray) -> str:
+    """
+    Polyline path data ("Mx,y Lx,y ...") for an (N, 2) point array.
+    A NaN row separates subpaths (glyphs made of several components).
+    """
+    if len(points) == 0:
+        return ""
+    parts = []
+    for sub in np.split(points, np.flatnonzero(np.isnan(points[:, 0]))):
+        sub = sub[~np.isnan(sub[:, 0])]
+        if len(sub):
+            parts.append("M" + " L".join(f"{x:g},{y:g}" for x, y in sub.tolist()))
+    return " ".join(parts)
+
+
+def join_subpaths(subpaths: List[np.ndarray]) -> np.ndarray:
+    """Concatenate component point arrays with NaN separator rows."""
+    sep = np.full((1, 2), np.nan, dtype=np.float32)
+    rows = []
+    for k, sub in enumerate(subpaths):
+        if k:
+            rows.append(sep)
+        rows.append(np.asarray(sub, dtype=np.float32).reshape(-1, 2))
+    return np.concatenate(rows) if rows else np.zeros((0, 2), dtype=np.float32)
+
+
+def path_to_points(path_str: str) -> np.ndarray:
+    """Points of an M/L polyline path. Only needed for profiles trained before geometry was stored."""
+    subpaths = []
+    for sub in (path_str or "").split("M")[1:]:
+        nums = np.array(_NUMBER.findall(sub), dtype=np.float32)
+        subpaths.append(nums[: len(nums) // 2 * 2].reshape(-1, 2))
+    return join_subpaths(subpaths)
+
+
+def pack_glyph_geometry(
+    char_db: Dict[str, Any], points: Optional[Dict[str, List[np.ndarray]]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Pack every variant's points into flat arrays.
+    'chars' are sorted code points of the characters with variants (same order as the
+    layout width table); character c owns variants char_offsets[c]:char_offsets[c + 1]
+    (in char_db order) and variant v owns points[variant_offsets[v]:variant_offsets[v + 1]].
+    `points` maps a character to its variants' point arrays; variants without
+    them fall back to parsing their path string.
+    """
+    points = points or {}
+    chars = sorted(ch for ch, data in char_db.items() if len(ch) == 1 and data and data.get("variants"))
+    variants, pts = [], []
+    for ch in chars:
+        known = points.get(ch, [])
+        for k, v in enumerate(char_db[ch]["variants"]):
+            variants.append(v)
+            if k < len(known):
+                pts.append(np.asarray(known[k], dtype=np.float32).reshape(-1, 2))
+            else:
+                pts.append(path_to_points(v.get("path", "")))
+    counts = np.array([len(p) for p in pts], dtype=np.int64)
+    return {
+        "chars": np.array([ord(ch) for ch in chars], dtype=np.uint32),
+        "char_offsets": np.concatenate(([0], np.cumsum([len(char_db[ch]["variants"]) for ch in chars]))).astype(np.int64),
+        "variant_offsets": np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+        "points": np.concatenate(pts) if pts else np.zeros((0, 2), dtype=np.float32),
+        "bbox": np.array([v.get("bbox") or (0, 0, 0, 0) for v in variants], dtype=np.float32).reshape(-1, 4),
+    }
+
+
+def variant_points(geometry: Dict[str, np.ndarray], char_index: int, variant: int) -> np.ndarray:
+    """Point array of one variant (a view into the packed buffer)."""
+    row = geometry["char_offsets"][char_index] + variant
+    start, end = geometry["variant_offsets"][row], geometry["variant_offsets"][row + 1]
+    return geometry["points"][start:end]
+
+
+def save_glyph_geometry(path: str, geometry: Dict[str, np.ndarray]) -> str:
+    """Write packed geometry as an .npz sidecar next to the style profile."""
+    if not path.endswith(GEOMETRY_SUFFIX):
+        path += GEOMETRY_SUFFIX
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez(path, **geometry)
+    return path
+
+
+def load_glyph_geometry(path: Optional[str]) -> Optional[Dict[str, np.ndarray]]:
+    if not path or not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {k: data[k] for k in data.files}
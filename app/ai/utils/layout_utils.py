@@ -0,0 +1,107 @@
+# app/ai/utils/layout_utils.py
+from typing import Dict, Any, Tuple
+import numpy as np
+
+# every code point str.isspace() treats as whitespace (all of them are <= U+3000)
+WHITESPACE_CODES = np.array([c for c in range(0x3001) if chr(c).isspace()], dtype=np.uint32)
+NEWLINE = ord("\n")
+
+
+def build_width_table(char_db: Dict[str, Any], default_width: float = 40) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sorted code points of every character with variants, and their avg widths.
+    Look characters up with np.searchsorted on the first array.
+    """
+    chars = sorted(ch for ch, data in char_db.items() if len(ch) == 1 and data and data.get("variants"))
+    codes = np.array([ord(ch) for ch in chars], dtype=np.uint32)
+    widths = np.array([char_db[ch].get("avg_width", default_width) for ch in chars], dtype=np.float64)
+    return codes, widths
+
+
+def lookup_glyphs(cp: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """Index into the width table for each code point, -1 when the style lacks it."""
+    if len(codes) == 0:
+        return np.full(len(cp), -1, dtype=np.int64)
+    idx = np.minimum(np.searchsorted(codes, cp), len(codes) - 1)
+    return np.where(codes[idx] == cp, idx, -1)
+
+
+def layout_text(
+    text: str,
+    codes: np.ndarray,
+    widths: np.ndarray,
+    line_width: float,
+    space: float = 40,
+    letter_spacing: float = 6,
+) -> Dict[str, np.ndarray]:
+    """
+    Word-aware greedy line breaking for a whole document.
+    Advances and word extents come from prefix sums, and each line's last
+    word is found with one searchsorted, so Python only loops once per line.
+    Words wider than a line are split at character boundaries.
+    Returns per-character arrays: 'glyph' (width-table index, -1 = not drawn),
+    'x' (offset from the left margin) and 'line' (line number).
+    """
+    cp = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    n = len(cp)
+    glyph = lookup_glyphs(cp, codes)
+    is_ws = np.isin(cp, WHITESPACE_CODES)
+    glyph[is_ws] = -1
+    advance = np.full(n, float(space))
+    drawn = glyph >= 0
+    advance[drawn] = widths[glyph[drawn]] + letter_spacing
+    is_newline = cp == NEWLINE
+    advance[is_newline] = 0
+    end = np.cumsum(advance)
+    pos = end - advance
+    para = np.cumsum(is_newline)
+    # x where each paragraph starts, so leading indentation is kept
+    para_origin = pos[np.concatenate(([0], np.flatnonzero(is_newline)))] if n else pos
+
+    line = para.copy()
+    x = np.zeros(n, dtype=np.float64)
+    in_word = ~is_ws
+    if not in_word.any():
+        return {"glyph": glyph, "x": x, "line": line}
+
+    # word (segment) starts: first char of each non-space run, plus forced splits of overlong words
+    starts = in_word & ~np.concatenate(([False], in_word[:-1]))
+    word_id = np.cumsum(starts) - 1
+    word_origin = pos[starts][np.maximum(word_id, 0)]
+    chunk = np.floor((end - word_origin - 1e-9) / max(line_width, 1e-9)).astype(np.int64)
+    split = in_word & ~starts & (chunk != np.concatenate(([0], chunk[:-1])))
+    seg_starts = np.flatnonzero(starts | split)
+    in_word_idx = np.flatnonzero(in_word)
+
+    # last char of each segment = char before the next segment start / word end
+    seg_of_char = np.searchsorted(seg_starts, in_word_idx, side="right") - 1
+    seg_last = np.full(len(seg_starts), -1, dtype=np.int64)
+    np.maximum.at(seg_last, seg_of_char, in_word_idx)
+    seg_x0 = pos[seg_starts]
+    seg_x1 = end[seg_last]
+    seg_para = para[seg_starts]
+    para_last_seg = np.searchsorted(seg_para, seg_para, side="right") - 1
+
+    seg_line = np.empty(len(seg_starts), dtype=np.int64)
+    seg_origin = np.empty(len(seg_starts), dtype=np.float64)
+    current, prev_para, i = 0, 0, 0
+    while i < len(seg_starts):
+        p = int(seg_para[i])
+        if i == 0 or p != prev_para:
+            # hard break: the line starts at the paragraph origin
+            current += p - prev_para
+            prev_para = p
+            origin = para_origin[p]
+        else:
+            # soft wrap: the line starts at this word
+            current += 1
+            origin = seg_x0[i]
+        j = int(np.searchsorted(seg_x1, origin + line_width, side="right")) - 1
+        j = min(max(j, i), int(para_last_seg[i]))
+        seg_line[i:j + 1] = current
+        seg_origin[i:j + 1] = origin
+        i = j + 1
+
+    line[in_word_idx] = seg_line[seg_of_char]
+    x[in_word_idx] = pos[in_word_idx] - seg_origin[seg_of_char]
+    return {"glyph": glyph, "x": x, "line": line}
@@ -0,0 +1,66 @@
+# app/ai/utils/sampling_utils.py
+from typing import Dict, Any, Sequence, Tuple
+import numpy as np
+
+
+def build_alias_table(weights: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Walker/Vose alias table for one discrete distribution.
+    Returns (prob, alias): pick column k uniformly, keep it with probability prob[k],
+    otherwise take alias[k]. Non-positive or missing weights fall back to uniform.
+    """
+    w = np.clip(np.asarray(weights, dtype=np.float64), 0, None)
+    n = len(w)
+    if n == 0:
+        return np.zeros(0), np.zeros(0, dtype=np.int64)
+    total = w.sum()
+    scaled = w * (n / total) if total > 0 else np.ones(n)
+    prob = np.ones(n)
+    alias = np.arange(n, dtype=np.int64)
+    small = [k for k in range(n) if scaled[k] < 1.0]
+    large = [k for k in range(n) if scaled[k] >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] -= 1.0 - scaled[s]
+        (small if scaled[l] < 1.0 else large).append(l)
+    # leftovers are 1.0 up to rounding error
+    return prob, alias
+
+
+def build_alias_tables(char_db: Dict[str, Any], chars: Sequence[str]) -> Dict[str, np.ndarray]:
+    """
+    Alias tables for every character in `chars` (width-table order), flattened into
+    shared arrays: character g owns columns offsets[g]:offsets[g] + counts[g].
+    Variant weights come from each variant's 'frequency' (default 1.0).
+    """
+    weights = [v.get("frequency", 1.0) for ch in chars for v in char_db[ch]["variants"]]
+    counts = [len(char_db[ch]["variants"]) for ch in chars]
+    return build_alias_tables_from_weights(np.asarray(weights, dtype=np.float64), np.concatenate(([0], np.cumsum(counts))))
+
+
+def build_alias_tables_from_weights(weights: np.ndarray, char_offsets: np.ndarray) -> Dict[str, np.ndarray]:
+    """Same as build_alias_tables, from flat variant weights where character g owns weights[char_offsets[g]:char_offsets[g + 1]]."""
+    char_offsets = np.asarray(char_offsets, dtype=np.int64)
+    counts = np.diff(char_offsets)
+    probs, aliases = [], []
+    for start, end in zip(char_offsets[:-1].tolist(), char_offsets[1:].tolist()):
+        prob, alias = build_alias_table(weights[start:end])
+        probs.append(prob)
+        aliases.append(alias)
+    return {
+        "counts": counts,
+        "offsets": char_offsets[:-1],
+        "prob": np.concatenate(probs) if probs else np.zeros(0),
+        "alias": np.concatenate(aliases) if aliases else np.zeros(0, dtype=np.int64),
+    }
+
+
+def sample_variants(tables: Dict[str, np.ndarray], glyph: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Draw one variant index per glyph (width-table index) in a single vectorized pass."""
+    u = rng.random((2, len(glyph)))
+    n = tables["counts"][glyph]
+    k = np.minimum((u[0] * n).astype(np.int64), n - 1)
+    col = tables["offsets"][glyph] + k
+    return np.where(u[1] < tables["prob"][col], k, tables["alias"][col])
@@ -1,22 +1,78 @@
 # app/ai/utils/svg_utils.py
-from typing import List, Dict
+from typing import List, Dict, Iterable, BinaryIO, Tuple
+from xml.sax.saxutils import escape
+
+SVG_HEADER = (
+    '<?xml version="1.0" encoding="utf-8" ?>\n'
+    '<svg baseProfile="full" height="{height}" version="1.1" width="{width}" '
+    'xmlns="http://www.w3.org/2000/svg" xmlns:ev="http://www.w3.org/2001/xml-events" '
+    'xmlns:xlink="http://www.w3.org/1999/xlink">'
+)
 
 def svg_path_to_plain(path_str: str) -> str:
     # placeholder helper: currently returns input
     return path_str
 
+def _attr(value) -> str:
+    return escape(str(value), {'"': "&quot;"})
+
+
 def wrap_paths_into_svg(paths: List[Dict], width: int = 2480, height: int = 3508) -> str:
     """
     Build a minimal SVG string from paths (each dict with 'd', 'stroke', 'stroke_width', 'transform')
+    Each distinct path is emitted once in <defs> and placed with <use>.
     """
     header = f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">'
+    ids: Dict[str, int] = {}
+    defs = []
     body = []
     for p in paths:
         d = p.get("d") or p.get("path") or ""
+        gid = ids.get(d)
+        if gid is None:
+            gid = ids[d] = len(defs)
+            defs.append(f'<path id="g{gid}" d="{_attr(d)}" />')
         stroke = p.get("stroke", "#000")
         sw = p.get("stroke_width", 2)
         transform = p.get("transform", "")
         tattr = f' transform="{transform}"' if transform else ""
-        body.append(f'<path d="{d}" stroke="{stroke}" stroke-width="{sw}" fill="none"{tattr} />')
+        body.append(f'<use href="#g{gid}" stroke="{stroke}" stroke-width="{sw}" fill="none"{tattr} />')
     footer = "</svg>"
-    return "\n".join([header] + body + [footer])
+    return "\n".join([header, "<defs>"] + defs + ["</defs>"] + body + [footer])
+
+
+def write_svg_page(
+    out: BinaryIO,
+    glyphs: List[str],
+    placements: Iterable[Tuple[int, float, float]],
+    width: str,
+    height: str,
+    group_id: str = "page_0",
+    stroke: str = "#000",
+    stroke_width=2,
+    chunk_size: int = 512,
+) -> None:
+    """
+    Stream one SVG page to a binary file without building a DOM.
+    Each glyph path data is written once in <defs> as id "g<index>"; placements
+    are (glyph index, x, y) tuples written as translated <use> references.
+    Stroke styling sits on the page group and is inherited by every glyph.
+    """
+    out.write(SVG_HEADER.format(width=_attr(width), height=_attr(height)).encode("utf-8"))
+    buf = ["<defs>"]
+    for gid, d in enumerate(glyphs):
+        buf.append(f'<path d="{_attr(d)}" id="g{gid}" />')
+        if len(buf) >= chunk_size:
+            out.write("".join(buf).encode("utf-8"))
+            buf.clear()
+    buf.append(
+        f'</defs><g fill="none" id="{_attr(group_id)}" stroke="{_attr(stroke)}" stroke-linecap="round" '
+        f'stroke-linejoin="round" stroke-width="{_attr(stroke_width)}">'
+    )
+    for gid, x, y in placements:
+        buf.append(f'<use href="#g{gid}" transform="translate({x},{y})" />')
+        if len(buf) >= chunk_size:
+            out.write("".join(buf).encode("utf-8"))
+            buf.clear()
+    buf.append("</g></svg>")
+    out.write("".join(buf).encode("utf-8"))
@@ -1,19 +1,23 @@
 # app/api/routes/generation.py
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import List, Optional, Dict
 from pydantic import BaseModel
 from app.api.routes.auth import get_current_user
+from app.api.routes.styles import get_cached_style, style_embedding, style_version
 # Use mock database fallback
 try:
     from app.core.firebase import db
 except:
     from app.core.mock_db import mock_db as db
 from datetime import datetime
+import json
 import uuid
 try:
-    from app.services.generation_service import GenerationService
+    from app.services.generation_service import GenerationService, generation_fingerprint
 except:
     GenerationService = None
+    generation_fingerprint = None
 
 router = APIRouter()
 if GenerationService:
@@ -30,16 +34,31 @@ class DocumentCreate(BaseModel):
     fontStyle: Optional[str] = "normal"
 
 
-def run_generation_job(job_id: str):
+async def run_generation_job(job_id: str):
     """Background task to run generation job."""
-    gen_service = GenerationService()
+    # Reuse the module-level service so jobs share loaded models and caches
+    gen_service = generation_service
     job_ref = db.collection("generation_jobs").document(job_id)
     try:
+        job = job_ref.get().to_dict()
         job_ref.update({"status": "processing", "progress": 0.05})
-        gen_service.generate_job_sync(job_id)
+        style_data = await get_cached_style(job["style_id"])
+        if style_data is None:
+            raise ValueError(f"Style {job['style_id']} not found")
+        # The fingerprint lets identical jobs share the service's result cache and in-flight run
+        result = await gen_service.generate_handwriting(
+            style_embedding(job["style_id"], style_data),
+            job["text"],
+            pen_settings=job.get("pen_settings"),
+            page_settings=job.get("page_settings"),
+            mode=job.get("mode", "fast"),
+            fingerprint=job.get("fingerprint")
+        )
         job_ref.update({
             "status": "completed",
             "progress": 1.0,
+            "page_count": result["page_count"],
+            "stroke_count": result["stroke_count"],
             "completed_at": datetime.utcnow().isoformat()
         })
     except Exception as e:
@@ -56,20 +75,41 @@ async def generate(
     text: str,
     pen_settings: Optional[Dict] = None,
     page_settings: Optional[Dict] = None,
+    mode: str = "fast",
     background_tasks: BackgroundTasks = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Create a new handwriting generation job."""
+    """Create a new handwriting generation job.
+    
+    Identical requests (same style version, text, settings and mode) that are
+    still running or already completed are answered with the existing job.
+    """
     uid = current_user["uid"]
     
     # Validate style exists and belongs to user
-    style_doc = db.collection("styles").document(style_id).get()
-    if not style_doc.exists:
+    style_data = await get_cached_style(style_id)
+    if style_data is None:
         raise HTTPException(status_code=404, detail="Style not found")
-    style_data = style_doc.to_dict()
     if style_data.get("uid") != uid:
         raise HTTPException(status_code=403, detail="Forbidden")
     
+    fingerprint = None
+    if generation_fingerprint:
+        fingerprint = generation_fingerprint(
+            f"{style_id}:{style_version(style_data)}", text, pen_settings, page_settings, mode
+        )
+        existing = db.collection("generation_jobs").where("uid", "==", uid).where("fingerprint", "==", fingerprint)
+        for doc in existing.stream():
+            existing_job = doc.to_dict()
+            if existing_job.get("status") in ("queued", "processing", "completed"):
+                return {
+                    "job_id": doc.id,
+                    "status": existing_job.get("status"),
+                    "message": "Identical generation job reused",
+                    "deduplicated": True,
+                    "created_at": existing_job.get("created_at")
+                }
+    
     job_id = uuid.uuid4().hex
     job_doc = {
         "uid": uid,
@@ -77,6 +117,8 @@ async def generate(
         "text": text,
         "pen_settings": pen_settings or {},
         "page_settings": page_settings or {},
+        "mode": mode,
+        "fingerprint": fingerprint,
         "status": "queued",
         "progress": 0.0,
         "created_at": datetime.utcnow().isoformat()
@@ -93,6 +135,41 @@ async def generate(
     }
 
 
+@router.post("/stream")
+async def generate_stream(
+    style_id: str,
+    text: str,
+    pen_settings: Optional[Dict] = None,
+    page_settings: Optional[Dict] = None,
+    mode: str = "fast",
+    include_points: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream generated pages as NDJSON, one line per page as soon as it is laid out."""
+    uid = current_user["uid"]
+    if generation_service is None:
+        raise HTTPException(status_code=503, detail="Generation service unavailable")
+    
+    style_data = await get_cached_style(style_id)
+    if style_data is None:
+        raise HTTPException(status_code=404, detail="Style not found")
+    if style_data.get("uid") != uid:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    
+    async def page_lines():
+        async for page in generation_service.generate_handwriting_stream(
+            style_embedding(style_id, style_data),
+            text,
+            pen_settings=pen_settings,
+            page_settings=page_settings,
+            mode=mode,
+            include_points=include_points
+        ):
+            yield json.dumps(page) + "\n"
+    
+    return StreamingResponse(page_lines(), media_type="application/x-ndjson")
+
+
 @router.get("/{job_id}")
 async def get_generation_status(
     job_id: str,
@@ -200,10 +277,9 @@ async def batch_generate(
     uid = current_user["uid"]
     
     # Validate style exists
-    style_doc = db.collection("styles").document(style_id).get()
-    if not style_doc.exists:
+    style_data = await get_cached_style(style_id)
+    if style_data is None:
         raise HTTPException(status_code=404, detail="Style not found")
-    style_data = style_doc.to_dict()
     if style_data.get("uid") != uid:
         raise HTTPException(status_code=403, detail="Forbidden")
     
@@ -217,6 +293,9 @@ async def batch_generate(
             "batch_id": batch_id,
             "style_id": style_id,
             "text": text,
+            "fingerprint": generation_fingerprint(
+                f"{style_id}:{style_version(style_data)}", text
+            ) if generation_fingerprint else None,
             "status": "queued",
             "progress": 0.0,
             "created_at": datetime.utcnow().isoformat()
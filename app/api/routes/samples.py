@@ -11,12 +11,20 @@ except Exception:
     from app.core.mock_db import mock_bucket as bucket, mock_db as db
     USE_FIREBASE = False
 from app.api.routes.auth import get_current_user
-import aiofiles
-import os
+from app.services.feature_extraction import artifact_path, extract_image_features, save_sample_features
+from app.services.image_processor import ImageProcessor
+import asyncio
 
 router = APIRouter()
-UPLOAD_TEMP = os.getenv("TEMP_DIR", "/tmp/writegen_uploads")
-os.makedirs(UPLOAD_TEMP, exist_ok=True)
+image_processor = ImageProcessor()
+
+
+def _process_upload(content: bytes):
+    """Decode an upload once; return the processed PNG and the page's handwriting features."""
+    gray = image_processor.decode_image(content)
+    processed_png = image_processor.encode_png(image_processor.process_array(gray))
+    return processed_png, extract_image_features(gray)
+
 
 @router.post("/upload")
 async def upload_samples(
@@ -29,10 +37,7 @@ async def upload_samples(
     
     uploaded = []
     uid = current_user.get("user_id") or current_user.get("uid")
-<<<<<<< HEAD
     logger.info(f"Upload request from user {uid}, {len(files)} files")
-=======
->>>>>>> 8bbe03e4b99a93cdf9105046218a1a8d56789978
     
     for f in files:
         logger.info(f"Processing file: {f.filename}, type: {f.content_type}")
@@ -43,20 +48,22 @@ async def upload_samples(
                 detail=f"Unsupported file type: {f.content_type}. Allowed: JPEG, PNG, WebP"
             )
         
-        suffix = f.filename.split(".")[-1]
-        tmp_path = os.path.join(UPLOAD_TEMP, f"{uuid.uuid4().hex}.{suffix}")
-        
-        async with aiofiles.open(tmp_path, "wb") as out_file:
-            content = await f.read()
-            if len(content) > 50 * 1024 * 1024:  # 50MB limit
-                raise HTTPException(status_code=413, detail="File too large")
-            await out_file.write(content)
+        content = await f.read()
+        if len(content) > 50 * 1024 * 1024:  # 50MB limit
+            raise HTTPException(status_code=413, detail="File too large")
+
+        # Decode once and clean the page up in memory, off the event loop
+        loop = asyncio.get_running_loop()
+        try:
+            processed_png, features = await loop.run_in_executor(None, _process_upload, content)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Could not decode image: {f.filename}")
 
-        # Upload to storage (with fallback if Firebase unavailable)
+        # Upload to storage straight from memory (with fallback if Firebase unavailable)
         try:
             blob_path = f"samples/{uid}/{datetime.utcnow().timestamp()}_{f.filename}"
             blob = bucket.blob(blob_path)
-            blob.upload_from_filename(tmp_path)
+            blob.upload_from_string(content, content_type=f.content_type)
             blob.make_public()
             public_url = blob.public_url
             logger.info(f"File uploaded to Firebase: {blob_path}")
@@ -64,13 +71,23 @@ async def upload_samples(
             logger.warning(f"Firebase upload failed: {e}. Using local fallback.")
             blob_path = f"local_samples/{uid}/{f.filename}"
             public_url = f"http://localhost:8000/files/{blob_path}"
+            processed_path = None
+        else:
+            # A failed processed copy keeps the uploaded original (it can be reprocessed from it)
+            processed_path = blob_path.rsplit(".", 1)[0] + "_processed.png"
+            try:
+                bucket.blob(processed_path).upload_from_string(processed_png, content_type="image/png")
+            except Exception as e:
+                logger.warning(f"Processed image upload failed: {e}")
+                processed_path = None
 
         sample_doc = {
             "uid": uid,
             "filename": f.filename,
             "storage_path": blob_path,
             "public_url": public_url,
-            "status": "uploaded",
+            "processed_path": processed_path,
+            "status": "processed" if processed_path else "uploaded",
             "size_bytes": len(content),
             "created_at": datetime.utcnow().isoformat()
         }
@@ -82,6 +99,14 @@ async def upload_samples(
             logger.error(f"Failed to save to Firestore: {e}")
             # Continue anyway with in-memory tracking
             doc_ref = type('obj', (object,), {'id': str(uuid.uuid4())})()
+
+        # Training loads this artifact instead of decoding the sample again
+        if features["strokes"]:
+            try:
+                await loop.run_in_executor(None, save_sample_features, artifact_path(doc_ref.id), features)
+            except Exception as e:
+                logger.warning(f"Failed to save features for sample {doc_ref.id}: {e}")
+
         uploaded.append({
             "id": doc_ref.id,
             "filename": sample_doc["filename"],
@@ -89,11 +114,6 @@ async def upload_samples(
             "created_at": sample_doc["created_at"]
         })
 
-        try:
-            os.remove(tmp_path)
-        except:
-            pass
-
     return {
         "uploaded_count": len(uploaded),
         "samples": uploaded,
@@ -186,6 +206,8 @@ async def delete_sample(sample_id: str, current_user: dict = Depends(get_current
     try:
         blob = bucket.blob(data.get("storage_path"))
         blob.delete()
+        if data.get("processed_path"):
+            bucket.blob(data["processed_path"]).delete()
     except:
         pass
     
@@ -1,13 +1,22 @@
 # app/api/routes/styles.py
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Response
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
+from urllib.parse import quote
+import asyncio
+import logging
+import time
 try:
     from app.core.firebase import db
 except:
     from app.core.mock_db import mock_db as db
 from app.api.routes.auth import get_current_user
+from app.core.config import settings
+from app.core.embedding_store import decode_embedding, embedding_cache
+from app.core.preview_cache import preview_cache
+from app.core.style_cache import style_cache
+from app.services.embedding_index import build_index, near_duplicates
 try:
     from app.services.style_service import StyleService
     style_service = StyleService()
@@ -15,6 +24,108 @@ except:
     style_service = None
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def _load_style(style_id: str) -> Optional[Dict]:
+    doc = db.collection("styles").document(style_id).get()
+    return doc.to_dict() if doc.exists else None
+
+
+async def get_cached_style(style_id: str) -> Optional[Dict]:
+    """Style document through the read-through cache (``None`` if it does not exist)."""
+    return await style_cache.get(style_id, _load_style)
+
+
+def style_version(style_data: Dict) -> str:
+    """Version tag of a style; changes whenever the style is retrained or edited."""
+    return str(
+        style_data.get("version")
+        or style_data.get("last_retrained_at")
+        or style_data.get("updated_at")
+        or style_data.get("created_at", "")
+    )
+
+
+def style_embedding(style_id: str, style_data: Dict):
+    """Decoded style embedding (zeros if absent), cached per style version."""
+    return embedding_cache.get(
+        style_id,
+        style_version(style_data),
+        style_data.get("embedding"),
+        style_data.get("embedding_dim", 512)
+    )
+
+
+def _check_preview_text(text: str) -> None:
+    if len(text) > settings.preview_max_text_length:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Preview text is limited to {settings.preview_max_text_length} characters"
+        )
+
+
+async def render_cached_preview(style_id: str, style_data: Dict, text: str) -> bytes:
+    """Preview PNG for the style's current version, rendered off the event loop on a miss."""
+    version = style_version(style_data)
+    png = preview_cache.get(style_id, version, text)
+    if png is None:
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(None, style_service.render_preview, style_data, text)
+        preview_cache.put(style_id, version, text, png)
+    return png
+
+
+async def _prerender_previews(style_id: str):
+    """Render the default and recently used preview texts for the style's latest version."""
+    style_cache.invalidate(style_id)
+    data = await get_cached_style(style_id)
+    if data is None or not style_service:
+        return
+    loop = asyncio.get_running_loop()
+    version = style_version(data)
+    for text in preview_cache.texts_to_prerender(style_id):
+        png = await loop.run_in_executor(None, style_service.render_preview, data, text)
+        preview_cache.put(style_id, version, text, png)
+
+
+_preset_index = {"index": None, "names": {}, "built_at": 0.0, "refresh": None}
+
+
+def _build_preset_index():
+    """Scan public presets and index their embeddings (blocking; runs in an executor)."""
+    presets = [
+        (d.id, d.to_dict())
+        for d in db.collection("style_presets").where("is_public", "==", True).stream()
+    ]
+    presets = [(pid, p) for pid, p in presets if p.get("embedding")]
+    # decoded directly so a large catalog does not evict user styles from embedding_cache
+    vectors = [decode_embedding(p["embedding"], p.get("embedding_dim", 512)) for _, p in presets]
+    index = build_index([pid for pid, _ in presets], vectors)
+    return index, {pid: p.get("name") for pid, p in presets}
+
+
+async def _refresh_preset_index():
+    loop = asyncio.get_running_loop()
+    try:
+        _preset_index["index"], _preset_index["names"] = await loop.run_in_executor(None, _build_preset_index)
+        _preset_index["built_at"] = time.monotonic()
+    finally:
+        _preset_index["refresh"] = None
+
+
+async def _get_preset_index():
+    """Index over public preset embeddings, rebuilt every ``preset_index_refresh_seconds``.
+
+    Only the first call waits for a build; afterwards a stale index keeps serving
+    while a single background task rebuilds it off the event loop.
+    """
+    if _preset_index["index"] is None or time.monotonic() - _preset_index["built_at"] > settings.preset_index_refresh_seconds:
+        if _preset_index["refresh"] is None:
+            _preset_index["refresh"] = asyncio.ensure_future(_refresh_preset_index())
+        if _preset_index["index"] is None:
+            await asyncio.shield(_preset_index["refresh"])
+    return _preset_index["index"], _preset_index["names"]
 
 
 class StyleCreate(BaseModel):
@@ -58,6 +169,7 @@ async def create_style(
     # Background training (optional if service available)
     if style_service:
         background_tasks.add_task(style_service.train_style, style_id, samples)
+        background_tasks.add_task(_prerender_previews, style_id)
 
     return {
         "style_id": style_id,
@@ -88,14 +200,13 @@ async def list_styles(current_user: dict = Depends(get_current_user)):
 async def get_style(style_id: str, current_user: dict = Depends(get_current_user)):
     """Get details of a specific style."""
     uid = current_user.get("uid") or current_user.get("user_id")
-    doc = db.collection("styles").document(style_id).get()
-    if not doc.exists:
+    data = await get_cached_style(style_id)
+    if data is None:
         raise HTTPException(status_code=404, detail="Style not found")
-    data = doc.to_dict()
     if data.get("uid") != uid:
         raise HTTPException(status_code=403, detail="Forbidden")
     return {
-        "id": doc.id,
+        "id": style_id,
         **data,
         "fetched_at": datetime.utcnow().isoformat()
     }
@@ -124,6 +235,7 @@ async def update_style(
     update_data["updated_at"] = datetime.utcnow().isoformat()
     
     db.collection("styles").document(style_id).update(update_data)
+    style_cache.invalidate(style_id)
     
     return {
         "style_id": style_id,
@@ -159,6 +271,11 @@ async def retrain_style(
     
     if not samples:
         raise HTTPException(status_code=400, detail="No valid samples provided")
+    # Samples the style was already trained on are not processed again
+    trained = set(data.get("sample_ids", []))
+    new_ids = [s["id"] for s in samples if s["id"] not in trained]
+    if not new_ids:
+        raise HTTPException(status_code=400, detail="All samples are already part of this style")
     
     # Start retraining
     db.collection("styles").document(style_id).update({
@@ -166,8 +283,9 @@ async def retrain_style(
         "last_retrained_at": datetime.utcnow().isoformat(),
         "sample_ids": list(set(data.get("sample_ids", []) + sample_ids))
     })
+    style_cache.invalidate(style_id)
     
-    background_tasks.add_task(style_service.retrain_style, style_id, samples)
+    background_tasks.add_task(_retrain_and_store, style_id, new_ids, data.get("status"))
     
     return {
         "style_id": style_id,
@@ -176,6 +294,91 @@ async def retrain_style(
         "started_at": datetime.utcnow().isoformat()
     }
 
+_retrain_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def _retrain_and_store(style_id: str, sample_ids: List[str], previous_status: Optional[str] = None):
+    """Merge new samples into the stored profile and write the result back.
+
+    Retrains of one style run one at a time, and each merges into the profile
+    as stored when it starts, so overlapping retrains do not drop each
+    other's samples. A failure marks the style as errored.
+    """
+    lock = _retrain_locks.setdefault(style_id, asyncio.Lock())
+    async with lock:
+        try:
+            loop = asyncio.get_running_loop()
+            profile = await loop.run_in_executor(None, _load_style, style_id)
+            if profile is None:
+                return
+            result = await style_service.retrain_style(style_id, sample_ids, profile=profile)
+            updates = {
+                k: result[k]
+                for k in ("embedding", "parameters", "feature_stats", "character_database", "covered_glyphs", "sample_count", "updated_at")
+            }
+            updates["status"] = previous_status if previous_status not in (None, "retraining", "error") else "completed"
+            updates["version"] = int(profile.get("version") or 0) + 1
+            db.collection("styles").document(style_id).update(updates)
+        except Exception as e:
+            logger.error(f"Retraining style {style_id} failed: {e}", exc_info=True)
+            db.collection("styles").document(style_id).update({
+                "status": "error",
+                "error": str(e),
+                "failed_at": datetime.utcnow().isoformat()
+            })
+            style_cache.invalidate(style_id)
+            return
+    style_cache.invalidate(style_id)
+    embedding_cache.invalidate(style_id)
+    preview_cache.invalidate(style_id)
+    await _prerender_previews(style_id)
+
+@router.get("/{style_id}/similar-presets")
+async def similar_presets(style_id: str, k: int = 5, current_user: dict = Depends(get_current_user)):
+    """Public presets closest to this style's embedding."""
+    uid = current_user.get("uid") or current_user.get("user_id")
+    data = await get_cached_style(style_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Style not found")
+    if data.get("uid") != uid:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if not data.get("embedding"):
+        raise HTTPException(status_code=400, detail="Style not trained yet")
+    index, names = await _get_preset_index()
+    matches = index.search(style_embedding(style_id, data), k)[0]
+    return {
+        "style_id": style_id,
+        "presets": [{"preset_id": pid, "name": names.get(pid), "similarity": score} for pid, score in matches]
+    }
+
+@router.get("/{style_id}/duplicates")
+async def duplicate_styles(
+    style_id: str,
+    threshold: float = 0.97,
+    current_user: dict = Depends(get_current_user)
+):
+    """The user's other styles whose embeddings are near-identical to this one."""
+    uid = current_user.get("uid") or current_user.get("user_id")
+    data = await get_cached_style(style_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Style not found")
+    if data.get("uid") != uid:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if not data.get("embedding"):
+        raise HTTPException(status_code=400, detail="Style not trained yet")
+    others = [
+        (d.id, d.to_dict())
+        for d in db.collection("styles").where("uid", "==", uid).stream()
+        if d.id != style_id
+    ]
+    others = [(sid, o) for sid, o in others if o.get("embedding")]
+    index = build_index([sid for sid, _ in others], [style_embedding(sid, o) for sid, o in others])
+    matches = near_duplicates(index, style_embedding(style_id, data), threshold)
+    return {
+        "style_id": style_id,
+        "duplicates": [{"style_id": sid, "similarity": score} for sid, score in matches]
+    }
+
 @router.delete("/{style_id}")
 async def delete_style(style_id: str, current_user: dict = Depends(get_current_user)):
     """Delete a style."""
@@ -188,6 +391,9 @@ async def delete_style(style_id: str, current_user: dict = Depends(get_current_u
         raise HTTPException(status_code=403, detail="Forbidden")
     
     db.collection("styles").document(style_id).delete()
+    style_cache.invalidate(style_id)
+    embedding_cache.invalidate(style_id)
+    preview_cache.invalidate(style_id)
     
     return {
         "style_id": style_id,
@@ -204,19 +410,49 @@ async def preview_style(
 ):
     """Generate a preview of handwriting with this style."""
     uid = current_user["uid"]
-    doc = db.collection("styles").document(style_id).get()
-    if not doc.exists:
+    data = await get_cached_style(style_id)
+    if data is None:
         raise HTTPException(status_code=404, detail="Style not found")
-    data = doc.to_dict()
     if data.get("uid") != uid:
         raise HTTPException(status_code=403, detail="Forbidden")
     if data.get("status") != "ready":
         raise HTTPException(status_code=400, detail="Style not ready yet")
+    _check_preview_text(text)
+
+    # render now so the returned URL is served straight from the cache
+    await render_cached_preview(style_id, data, text)
+    version = style_version(data)
     
     return {
         "style_id": style_id,
         "preview_text": text,
-        "preview_url": f"/previews/style_{style_id}_preview.png",
+        "preview_url": f"/api/styles/{style_id}/preview.png?text={quote(text)}&v={quote(version)}",
         "message": "Preview generated successfully",
         "generated_at": datetime.utcnow().isoformat()
     }
+
+@router.get("/{style_id}/preview.png")
+async def preview_image(
+    style_id: str,
+    text: str = "Hello World",
+    v: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Preview PNG for the style's current version.
+
+    ``v`` pins the style version (as in the URL returned by ``POST /preview``);
+    a URL for an older version is answered with 404 instead of newer pixels.
+    """
+    uid = current_user.get("uid") or current_user.get("user_id")
+    _check_preview_text(text)
+    data = await get_cached_style(style_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Style not found")
+    if data.get("uid") != uid:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if v is not None and v != style_version(data):
+        raise HTTPException(status_code=404, detail="Preview version not found")
+    png = await render_cached_preview(style_id, data, text)
+    # a versioned URL never changes content; an unversioned one follows retraining
+    cache_control = "private, max-age=31536000, immutable" if v is not None else "private, no-cache"
+    return Response(content=png, media_type="image/png", headers={"Cache-Control": cache_control})
@@ -67,9 +67,11 @@ class Settings:
         self.samples_dir = os.path.join(self.temp_dir, "samples")
         self.models_dir = os.path.join(self.temp_dir, "models")
         self.output_dir = os.path.join(self.temp_dir, "output")
+        # per-sample feature artifacts, reused by retraining
+        self.features_dir = os.path.join(self.temp_dir, "features")
         
         # Ensure directories exist
-        for directory in [self.samples_dir, self.models_dir, self.output_dir]:
+        for directory in [self.samples_dir, self.models_dir, self.output_dir, self.features_dir]:
             os.makedirs(directory, exist_ok=True)
         
         # Database Configuration
@@ -89,12 +91,49 @@ class Settings:
         # GPU Configuration
         self.use_gpu = os.getenv("USE_GPU", "false").lower() == "true"
         self.device = "cuda" if self.use_gpu else "cpu"
+        self.torch_num_threads = int(os.getenv("TORCH_NUM_THREADS", str(os.cpu_count() or 1)))
+        self.preload_models = os.getenv("PRELOAD_MODELS", "true").lower() == "true"
+        
+        # Inference Micro-batching
+        self.inference_batch_window_ms = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "10"))
+        self.inference_max_batch_size = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "16"))
         
         # Processing Configuration
         self.max_sample_size_mb = int(os.getenv("MAX_SAMPLE_SIZE_MB", "50"))
         self.max_document_length_chars = int(os.getenv("MAX_DOCUMENT_LENGTH_CHARS", "10000"))
         self.generation_timeout_seconds = int(os.getenv("GENERATION_TIMEOUT_SECONDS", "300"))
         
+        self.result_cache_size = int(os.getenv("RESULT_CACHE_SIZE", "64"))
+        # 0 = one worker per core
+        self.feature_workers = int(os.getenv("FEATURE_WORKERS", "0"))
+        
+        # Quality (diffusion) Mode
+        self.quality_denoise_steps = int(os.getenv("QUALITY_DENOISE_STEPS", "50"))
+        self.quality_workers = int(os.getenv("QUALITY_WORKERS", "2"))
+        self.quality_deadline_margin_seconds = float(os.getenv("QUALITY_DEADLINE_MARGIN_SECONDS", "2.0"))
+        
+        # Style Cache
+        self.style_cache_ttl_seconds = float(os.getenv("STYLE_CACHE_TTL_SECONDS", "60"))
+        self.style_cache_size = int(os.getenv("STYLE_CACHE_SIZE", "256"))
+        
+        # Style Embeddings
+        self.embedding_dtype = os.getenv("EMBEDDING_DTYPE", "f32")  # f32 | f16
+        self.embedding_cache_size = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+        # catalogs at least this large are searched with the IVF index
+        self.embedding_ivf_threshold = int(os.getenv("EMBEDDING_IVF_THRESHOLD", "50000"))
+        self.embedding_ivf_nprobe = int(os.getenv("EMBEDDING_IVF_NPROBE", "8"))
+        self.preset_index_refresh_seconds = float(os.getenv("PRESET_INDEX_REFRESH_SECONDS", "300"))
+        
+        # Style Previews
+        self.preview_cache_max_mb = int(os.getenv("PREVIEW_CACHE_MAX_MB", "32"))
+        self.preview_recent_texts = int(os.getenv("PREVIEW_RECENT_TEXTS", "5"))
+        self.preview_height_px = int(os.getenv("PREVIEW_HEIGHT_PX", "96"))
+        self.preview_max_text_length = int(os.getenv("PREVIEW_MAX_TEXT_LENGTH", "64"))
+        
+        # Glyph Cache
+        self.glyph_cache_max_mb = int(os.getenv("GLYPH_CACHE_MAX_MB", "64"))
+        self.glyph_cache_variants = int(os.getenv("GLYPH_CACHE_VARIANTS", "8"))
+        
         # Feature Flags
         self.enable_signature_generation = os.getenv("ENABLE_SIGNATURES", "true").lower() == "true"
         self.enable_exam_generator = os.getenv("ENABLE_EXAM_GENERATOR", "true").lower() == "true"
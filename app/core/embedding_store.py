@@ -0,0 +1,103 @@
+# app/core/embedding_store.py
+"""Binary storage format for style embeddings and a process-wide decode cache.
+
+Stored form is ``"v1:<dtype>:<base64>"`` where dtype is ``f32`` or ``f16``
+(little-endian). The same header followed by raw bytes is used when the value
+is stored as a blob. Decoding always yields a read-only float32 array, and
+decoded arrays are cached per ``(style_id, version)`` so a style is parsed at
+most once per version. Legacy hex-encoded float32 values still decode.
+"""
+import base64
+import threading
+from collections import OrderedDict
+from typing import Hashable, Union
+
+import numpy as np
+
+from app.core.config import settings
+
+FORMAT_VERSION = "v1"
+DTYPES = {"f32": np.dtype("<f4"), "f16": np.dtype("<f2")}
+
+
+def encode_embedding(embedding: np.ndarray, dtype: str = "f32", as_bytes: bool = False) -> Union[str, bytes]:
+    """Encode an embedding as a versioned, dtype-tagged base64 string (or blob with ``as_bytes``)."""
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    payload = np.ascontiguousarray(embedding, dtype=DTYPES[dtype]).tobytes()
+    header = f"{FORMAT_VERSION}:{dtype}:"
+    if as_bytes:
+        return header.encode("ascii") + payload
+    return header + base64.b64encode(payload).decode("ascii")
+
+
+def decode_embedding(raw: Union[str, bytes, None], dim: int = 512) -> np.ndarray:
+    """Decode any stored embedding form to a read-only float32 array (zeros if absent)."""
+    if not raw:
+        embedding = np.zeros(dim, dtype=np.float32)
+    elif isinstance(raw, (bytes, bytearray, memoryview)):
+        raw = bytes(raw)
+        version, dtype, payload = raw.split(b":", 2)
+        embedding = _from_payload(version.decode("ascii"), dtype.decode("ascii"), payload)
+    elif raw.startswith(f"{FORMAT_VERSION}:"):
+        version, dtype, payload = raw.split(":", 2)
+        embedding = _from_payload(version, dtype, base64.b64decode(payload))
+    else:
+        # legacy: hex of float32 bytes
+        embedding = np.frombuffer(bytes.fromhex(raw), dtype=np.float32).copy()
+    embedding.flags.writeable = False
+    return embedding
+
+
+def _from_payload(version: str, dtype: str, payload: bytes) -> np.ndarray:
+    if version != FORMAT_VERSION or dtype not in DTYPES:
+        raise ValueError(f"Unknown embedding format: {version}:{dtype}")
+    return np.frombuffer(payload, dtype=DTYPES[dtype]).astype(np.float32)
+
+
+class EmbeddingCache:
+    """Thread-safe LRU of decoded embeddings keyed by ``(style_id, version)``."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        style_id: str,
+        version: str,
+        raw: Union[str, bytes, None],
+        dim: int = 512
+    ) -> np.ndarray:
+        """Decoded embedding for this style version, decoding ``raw`` only on a miss."""
+        key = (style_id, version)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+            self.misses += 1
+        embedding = decode_embedding(raw, dim)
+        with self._lock:
+            self._entries[key] = embedding
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return embedding
+
+    def invalidate(self, style_id: str) -> None:
+        """Drop every cached version of a style."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == style_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Global embedding cache instance
+embedding_cache = EmbeddingCache(max_entries=settings.embedding_cache_size)
@@ -170,6 +170,10 @@ if not firebase_creds or not db or not bucket:
             self.op = op
             self.value = value
         
+        def where(self, field, op, value):
+            matched = {doc_id: doc_data for doc_id, doc_data in self.data.items() if self._match(doc_data)}
+            return MockQuery(matched, field, op, value)
+        
         def stream(self):
             results = []
             for doc_id, doc_data in self.data.items():
@@ -205,6 +209,9 @@ if not firebase_creds or not db or not bucket:
             except Exception as e:
                 logger.error(f"Failed to upload: {e}")
         
+        def upload_from_string(self, data, content_type=None):
+            self.files[self.name] = data if isinstance(data, bytes) else data.encode()
+        
         def download_to_filename(self, filename):
             try:
                 if self.name in self.files:
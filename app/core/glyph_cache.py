@@ -0,0 +1,121 @@
+# app/core/glyph_cache.py
+"""Process-wide cache of pre-generated glyph stroke variants.
+
+Entries are keyed by ``(style_key, char_code, variant_seed, pen_key)`` and hold
+a small pool of packed variants for that glyph. The cache is an LRU bounded by
+the total byte size of the cached arrays rather than by entry count.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+
+@dataclass
+class GlyphVariants:
+    """Pool of variants for one glyph; variant ``v`` owns ``points[offsets[v]:offsets[v + 1]]``."""
+    points: np.ndarray    # (M, 2) float32
+    pressure: np.ndarray  # (M,) float32
+    offsets: np.ndarray   # (V + 1,) int64
+
+    @property
+    def variant_count(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.points.nbytes + self.pressure.nbytes + self.offsets.nbytes
+
+
+def style_key(style_embedding: Optional[np.ndarray]) -> str:
+    """Short stable digest of a style embedding."""
+    if style_embedding is None:
+        return "none"
+    data = np.ascontiguousarray(style_embedding, dtype=np.float32).tobytes()
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def pen_key(pen_settings: Optional[Dict]) -> str:
+    """Canonical string form of pen settings for use in cache keys."""
+    return json.dumps(pen_settings or {}, sort_keys=True, default=str)
+
+
+class GlyphCache:
+    """Thread-safe LRU of ``GlyphVariants`` with a byte budget and hit/miss counters."""
+
+    def __init__(self, max_bytes: int, variants_per_glyph: int = 8):
+        self.max_bytes = max_bytes
+        self.variants_per_glyph = variants_per_glyph
+        self._entries: "OrderedDict[Hashable, GlyphVariants]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[GlyphVariants]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, entry: GlyphVariants) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            if entry.nbytes > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self.current_bytes += entry.nbytes
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def get_or_create(
+        self,
+        key: Hashable,
+        factory: Callable[[int], GlyphVariants]
+    ) -> GlyphVariants:
+        """Return the cached pool for ``key``, building it with ``factory(variants_per_glyph)`` on a miss."""
+        entry = self.get(key)
+        if entry is None:
+            entry = factory(self.variants_per_glyph)
+            self.put(key, entry)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+# Global glyph cache instance
+glyph_cache = GlyphCache(
+    max_bytes=settings.glyph_cache_max_mb * 1024 * 1024,
+    variants_per_glyph=settings.glyph_cache_variants
+)
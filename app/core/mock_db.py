@@ -135,6 +135,10 @@ class MockBlob:
         if os.path.exists(filename):
             self.bucket._files[self.path] = filename
     
+    def upload_from_string(self, data: bytes, content_type: str = None):
+        """Mock upload from memory."""
+        self.bucket._files[self.path] = data
+    
     def make_public(self):
         """Mock make public."""
         pass
@@ -0,0 +1,95 @@
+# app/core/preview_cache.py
+"""Process-wide cache of rendered style preview PNGs.
+
+Entries are keyed by ``(style_id, version, text)`` and hold encoded PNG bytes,
+so a retrained or edited style (new version) never serves an old preview. The
+cache is an LRU bounded by the total size of the stored images. It also
+remembers the last few texts previewed per style, which are pre-rendered
+again when a new version of the style is trained.
+"""
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+DEFAULT_PREVIEW_TEXT = "Hello World"
+
+
+class PreviewCache:
+    """Thread-safe byte-budgeted LRU of preview PNGs plus recent texts per style."""
+
+    def __init__(self, max_bytes: int, recent_texts: int = 5):
+        self.max_bytes = max_bytes
+        self.recent_texts = recent_texts
+        self._entries: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+        self._recent: Dict[str, Deque[str]] = {}
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, style_id: str, version: str, text: str) -> Optional[bytes]:
+        key = (style_id, version, text)
+        with self._lock:
+            self._remember(style_id, text)
+            png = self._entries.get(key)
+            if png is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return png
+
+    def put(self, style_id: str, version: str, text: str, png: bytes) -> None:
+        key = (style_id, version, text)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+            if len(png) > self.max_bytes:
+                return
+            self._entries[key] = png
+            self.current_bytes += len(png)
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def _remember(self, style_id: str, text: str) -> None:
+        recent = self._recent.get(style_id)
+        if recent is None:
+            recent = self._recent[style_id] = deque(maxlen=self.recent_texts)
+        if text in recent:
+            recent.remove(text)
+        recent.append(text)
+
+    def texts_to_prerender(self, style_id: str) -> List[str]:
+        """The default text followed by this style's recently previewed texts."""
+        with self._lock:
+            recent = list(self._recent.get(style_id, ()))
+        return [DEFAULT_PREVIEW_TEXT] + [t for t in reversed(recent) if t != DEFAULT_PREVIEW_TEXT]
+
+    def invalidate(self, style_id: str) -> None:
+        """Drop every cached preview of a style (recent texts are kept)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == style_id]:
+                self.current_bytes -= len(self._entries.pop(key))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+# Global preview cache instance
+preview_cache = PreviewCache(
+    max_bytes=settings.preview_cache_max_mb * 1024 * 1024,
+    recent_texts=settings.preview_recent_texts
+)
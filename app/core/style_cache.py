@@ -0,0 +1,97 @@
+# app/core/style_cache.py
+"""In-process read-through cache of style documents.
+
+Entries expire after a TTL and the cache holds at most ``max_entries`` styles
+(least recently used are dropped first). Concurrent misses for the same style
+share a single load, which runs off the event loop. Writers call
+``invalidate`` so the next read goes back to the database; a load that was
+already in flight when the style was invalidated is not stored.
+
+Every caller gets the same cached dict, so it is read-only: a handler that
+needs to change a style document must copy it first (or read it from the
+database).
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+
+class StyleCache:
+    """TTL + LRU cache of style dicts with single-flight loading."""
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    async def get(self, style_id: str, loader: Callable[[str], Optional[Dict]]) -> Optional[Dict]:
+        """Return the shared, read-only style dict, calling ``loader(style_id)`` on a miss; ``None`` if absent."""
+        with self._lock:
+            entry = self._entries.get(style_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(style_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        future = self._inflight.get(style_id)
+        if future is None:
+            future = asyncio.ensure_future(self._load(style_id, loader))
+            self._inflight[style_id] = future
+            future.add_done_callback(lambda f: self._finish(style_id, f))
+        data = await asyncio.shield(future)
+        return data
+
+    async def _load(self, style_id: str, loader: Callable[[str], Optional[Dict]]) -> Optional[Dict]:
+        loop = asyncio.get_running_loop()
+        self.loads += 1
+        return await loop.run_in_executor(None, loader, style_id)
+
+    def _finish(self, style_id: str, future: asyncio.Future) -> None:
+        if self._inflight.get(style_id) is not future:
+            # invalidated while loading: drop the possibly stale result
+            return
+        del self._inflight[style_id]
+        if future.cancelled() or future.exception() is not None or future.result() is None:
+            return
+        with self._lock:
+            self._entries[style_id] = (time.monotonic() + self.ttl_seconds, future.result())
+            self._entries.move_to_end(style_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, style_id: str) -> None:
+        with self._lock:
+            self._entries.pop(style_id, None)
+        self._inflight.pop(style_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        self._inflight.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+# Global style cache instance
+style_cache = StyleCache(
+    ttl_seconds=settings.style_cache_ttl_seconds,
+    max_entries=settings.style_cache_size
+)
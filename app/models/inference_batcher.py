@@ -0,0 +1,105 @@
+"""In-process dynamic micro-batching for stroke generator inference.
+
+Concurrent jobs submit token lists to one shared batcher. Requests that arrive
+within a short window (or until the batch is full) are padded into a single
+``StrokeGenerator.generate_batch`` call, which runs on a dedicated worker
+thread so the event loop keeps accepting requests, and results are scattered
+back to each caller's future.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.models.registry import model_registry
+from app.models.stroke_generator import StrokeGenerator
+
+logger = logging.getLogger(__name__)
+
+
+class StrokeInferenceBatcher:
+    """Collects ``generate`` requests and runs them as padded batches."""
+
+    def __init__(
+        self,
+        generator: StrokeGenerator,
+        window_ms: float = 10.0,
+        max_batch_size: int = 16
+    ):
+        self.generator = generator
+        self.window_s = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        # One worker: batches run back to back, each using torch's intra-op threads
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stroke-infer")
+        self._pending: List[Tuple[List[int], Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+        self.batches_run = 0
+        self.requests_served = 0
+
+    async def generate(self, tokens: List[int], style_embedding) -> List[Dict]:
+        """Queue one request and wait for its slice of the batched result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((list(tokens), style_embedding, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_s, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[List[int], Any, asyncio.Future]]) -> None:
+        loop = asyncio.get_running_loop()
+        self.batches_run += 1
+        self.requests_served += len(batch)
+        try:
+            results = await loop.run_in_executor(
+                self._executor,
+                self.generator.generate_batch,
+                [tokens for tokens, _, _ in batch],
+                [emb for _, emb, _ in batch]
+            )
+        except Exception as e:
+            logger.error(f"Batched inference failed for {len(batch)} requests: {e}", exc_info=True)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), strokes in zip(batch, results):
+            if not future.done():
+                future.set_result(strokes)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches_run": self.batches_run,
+            "requests_served": self.requests_served,
+            "avg_batch_size": self.requests_served / self.batches_run if self.batches_run else 0.0,
+            "pending": len(self._pending)
+        }
+
+
+_stroke_batcher: Optional[StrokeInferenceBatcher] = None
+
+
+def get_stroke_batcher() -> StrokeInferenceBatcher:
+    """Return the process-wide batcher, creating it on first use."""
+    global _stroke_batcher
+    if _stroke_batcher is None:
+        _stroke_batcher = StrokeInferenceBatcher(
+            model_registry.stroke_generator(),
+            window_ms=settings.inference_batch_window_ms,
+            max_batch_size=settings.inference_max_batch_size
+        )
+    return _stroke_batcher
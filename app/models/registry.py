@@ -0,0 +1,114 @@
+"""Process-wide registry of TorchScript models.
+
+Each model file is loaded at most once per process, either lazily on first use
+or eagerly at startup via ``preload``, warmed up with a dummy forward pass and
+then handed out as a shared handle. Torch is optional: without it, or without
+a model file, lookups return ``None`` and the wrappers keep their stub output.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+try:
+    import torch
+    HAS_TORCH = True
+except ImportError:
+    HAS_TORCH = False
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """Loads, warms up and shares TorchScript models and their wrappers."""
+
+    def __init__(self, device: str = "cpu", num_threads: int = 0):
+        self.device = device
+        self.num_threads = num_threads
+        self._models: Dict[Tuple[str, str], Optional[Any]] = {}
+        self._wrappers: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self._torch_configured = False
+        self.load_times: Dict[str, float] = {}
+
+    def _configure_torch(self) -> None:
+        if self._torch_configured or not HAS_TORCH:
+            return
+        if self.num_threads > 0:
+            torch.set_num_threads(self.num_threads)
+        self._torch_configured = True
+        logger.info(f"Torch using {torch.get_num_threads()} intra-op threads")
+
+    def load(
+        self,
+        model_path: Optional[str],
+        device: Optional[str] = None,
+        warmup_inputs: Optional[Callable[[], Tuple]] = None
+    ) -> Optional[Any]:
+        """Return the shared TorchScript module for ``model_path`` (``None`` if unavailable)."""
+        if not HAS_TORCH or not model_path:
+            return None
+        device = device or self.device
+        key = (os.path.abspath(model_path), device)
+        with self._lock:
+            if key in self._models:
+                return self._models[key]
+            self._configure_torch()
+            model = None
+            if os.path.exists(model_path):
+                start = time.perf_counter()
+                try:
+                    model = torch.jit.load(model_path, map_location=device)
+                    model.eval()
+                    if warmup_inputs is not None:
+                        self._warm_up(model, warmup_inputs, device)
+                except Exception as e:
+                    logger.warning(f"Failed to load model {model_path}: {e}")
+                    model = None
+                self.load_times[model_path] = time.perf_counter() - start
+            # Cache misses too so a missing file is not re-probed on every job
+            self._models[key] = model
+            return model
+
+    def _warm_up(self, model: Any, warmup_inputs: Callable[[], Tuple], device: str) -> None:
+        try:
+            inputs = tuple(t.to(device) for t in warmup_inputs())
+            with torch.inference_mode():
+                model(*inputs)
+        except Exception as e:
+            logger.warning(f"Model warm-up failed: {e}")
+
+    def _wrapper(self, name: str, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            if name not in self._wrappers:
+                self._wrappers[name] = factory()
+            return self._wrappers[name]
+
+    def stroke_generator(self):
+        """Shared ``StrokeGenerator`` backed by ``settings.stroke_generator_path``."""
+        from app.models.stroke_generator import StrokeGenerator
+        return self._wrapper(
+            "stroke_generator",
+            lambda: StrokeGenerator(settings.stroke_generator_path, self.device)
+        )
+
+    def style_encoder(self):
+        """Shared ``StyleEncoder`` backed by ``settings.style_encoder_path``."""
+        from app.models.style_encoder import StyleEncoder
+        return self._wrapper(
+            "style_encoder",
+            lambda: StyleEncoder(settings.style_encoder_path, self.device)
+        )
+
+    def preload(self) -> None:
+        """Load and warm up every known model (call once at startup)."""
+        self.stroke_generator()
+        self.style_encoder()
+        logger.info(f"Models preloaded: {self.load_times}")
+
+
+# Global model registry instance
+model_registry = ModelRegistry(device=settings.device, num_threads=settings.torch_num_threads)
@@ -0,0 +1,98 @@
+# app/models/stroke_batch.py
+"""Columnar, array-backed container for generated strokes.
+
+Every token of a document is one "glyph" slot. Glyph ``i`` owns the points
+``points[offsets[i]:offsets[i + 1]]``; spaces and newlines own an empty range
+so glyph indices line up with token indices throughout the pipeline.
+"""
+import base64
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+NEWLINE_CODE = -1
+SPACE_CODE = -2
+
+
+@dataclass
+class StrokeBatch:
+    points: np.ndarray      # (N, 2) float32 x/y
+    pressure: np.ndarray    # (N,) float32
+    offsets: np.ndarray     # (G + 1,) int64 start of each glyph in points
+    char_codes: np.ndarray  # (G,) int32 token per glyph (negative = special)
+    page_index: np.ndarray  # (G,) int32 page each glyph lands on
+
+    @classmethod
+    def from_counts(cls, char_codes: np.ndarray, counts: np.ndarray) -> "StrokeBatch":
+        """Allocate an uninitialised batch sized for ``counts`` points per glyph."""
+        offsets = np.zeros(len(char_codes) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        total = int(offsets[-1])
+        return cls(
+            points=np.empty((total, 2), dtype=np.float32),
+            pressure=np.empty(total, dtype=np.float32),
+            offsets=offsets,
+            char_codes=np.asarray(char_codes, dtype=np.int32),
+            page_index=np.zeros(len(char_codes), dtype=np.int32),
+        )
+
+    @property
+    def glyph_count(self) -> int:
+        return len(self.char_codes)
+
+    @property
+    def point_count(self) -> int:
+        return len(self.points)
+
+    @property
+    def page_count(self) -> int:
+        return int(self.page_index.max()) + 1 if self.glyph_count else 0
+
+    @property
+    def nbytes(self) -> int:
+        return (self.points.nbytes + self.pressure.nbytes + self.offsets.nbytes
+                + self.char_codes.nbytes + self.page_index.nbytes)
+
+    def point_counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def point_owner(self) -> np.ndarray:
+        """Glyph index of every point, shape (N,)."""
+        return np.repeat(np.arange(self.glyph_count), self.point_counts())
+
+    def glyphs_on_page(self, page: int) -> np.ndarray:
+        """Indices of drawable glyphs (non-empty, non-special) on ``page``."""
+        mask = (self.page_index == page) & (self.char_codes >= 0) & (self.point_counts() > 0)
+        return np.flatnonzero(mask)
+
+    def to_dicts(self, glyph_indices: Optional[np.ndarray] = None) -> List[Dict]:
+        """Expand glyphs into the legacy ``{"type", "character", "points"}`` dicts.
+
+        Only meant for the API edge, when a client explicitly asks for JSON points.
+        """
+        if glyph_indices is None:
+            glyph_indices = np.flatnonzero((self.char_codes >= 0) & (self.point_counts() > 0))
+        strokes = []
+        for i in np.asarray(glyph_indices).tolist():
+            start, end = self.offsets[i], self.offsets[i + 1]
+            xy = self.points[start:end].tolist()
+            pressure = self.pressure[start:end].tolist()
+            strokes.append({
+                "type": "glyph",
+                "character": chr(int(self.char_codes[i])),
+                "points": [
+                    {"x": x, "y": y, "pressure": p}
+                    for (x, y), p in zip(xy, pressure)
+                ]
+            })
+        return strokes
+
+    def to_packed_dict(self) -> Dict:
+        """JSON-safe packed form: base64 little-endian float32 columns plus offsets."""
+        return {
+            "points_b64": base64.b64encode(self.points.astype("<f4").tobytes()).decode("ascii"),
+            "pressure_b64": base64.b64encode(self.pressure.astype("<f4").tobytes()).decode("ascii"),
+            "offsets": self.offsets.tolist(),
+            "char_codes": self.char_codes.tolist()
+        }
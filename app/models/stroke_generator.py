@@ -5,12 +5,19 @@ Replace with actual model loading/inference when models are available.
 """
 from typing import Any, Dict, List, Optional
 
+import numpy as np
+
+from app.core.glyph_cache import GlyphVariants, glyph_cache, style_key
+from app.models.registry import model_registry
+
 try:
     import torch
     HAS_TORCH = True
 except ImportError:  # Torch is optional for lightweight environments
     HAS_TORCH = False
 
+PAD_TOKEN = -3
+
 
 class StrokeGenerator:
     """Mock stroke generator that returns simple stroke sequences."""
@@ -18,29 +25,99 @@ class StrokeGenerator:
     def __init__(self, model_path: Optional[str] = None, device: str = "cpu"):
         self.model_path = model_path
         self.device = device
-        self.model: Optional[Any] = None
-        if HAS_TORCH and model_path:
-            try:
-                self.model = torch.jit.load(model_path, map_location=device)
-                self.model.eval()
-            except Exception:
-                # Keep stub behavior if load fails
-                self.model = None
+        # Shared, warmed-up handle; None keeps stub behavior
+        self.model: Optional[Any] = model_registry.load(model_path, device, self.warmup_inputs)
+
+    @staticmethod
+    def warmup_inputs():
+        """Dummy ``(tokens, style)`` batch used to warm the model up after loading."""
+        return torch.zeros((1, 8), dtype=torch.long), torch.zeros((1, 512))
 
     def generate(self, tokens: List[int], style_embedding) -> List[Dict]:
         """Generate stroke dictionaries for given tokens.
 
-        This stub emits deterministic straight-line strokes per character; replace
-        with real model inference for production.
+        This stub emits deterministic jittered line strokes per character; replace
+        with real model inference for production. Each character gets a small
+        pool of variants from the process-wide glyph cache, and repeated
+        occurrences of a character within one call take successive variants,
+        so a request for ``n`` copies of a glyph samples ``n`` distinct shapes.
         """
+        style = style_key(style_embedding)
         strokes: List[Dict] = []
+        seen: Dict[int, int] = {}
         for tok in tokens:
             if tok < 0:
                 strokes.append({"type": "special", "token": tok, "points": []})
                 continue
-            points = [
-                {"x": float(i * 2), "y": float(i * 3), "pressure": 0.8}
-                for i in range(6)
-            ]
+            variants = glyph_cache.get_or_create(
+                ("stroke_generator", style, tok, 0, ""),
+                lambda n, tok=tok: self._generate_variants(tok, n)
+            )
+            v = seen.get(tok, 0) % variants.variant_count
+            seen[tok] = seen.get(tok, 0) + 1
+            start, end = variants.offsets[v], variants.offsets[v + 1]
+            xy = variants.points[start:end].tolist()
+            pressure = variants.pressure[start:end].tolist()
+            points = [{"x": x, "y": y, "pressure": p} for (x, y), p in zip(xy, pressure)]
             strokes.append({"type": "glyph", "character": chr(tok), "points": points})
         return strokes
+
+    def _generate_variants(self, token: int, count: int) -> GlyphVariants:
+        """Produce ``count`` deterministic stub variants for ``token``.
+
+        Each variant is a slanted line of 5 to 19 points with a little jitter,
+        seeded by the token so every process builds the same pool.
+        """
+        rng = np.random.default_rng(token)
+        lengths = rng.integers(5, 20, size=max(count, 1))
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        steps = np.concatenate([np.arange(n, dtype=np.float32) for n in lengths])
+        jitter = rng.normal(0.0, 0.3, size=(len(steps), 2)).astype(np.float32)
+        pressure = rng.uniform(0.7, 0.9, size=len(steps)).astype(np.float32)
+        return GlyphVariants(
+            points=np.stack([steps * 2, steps * 3], axis=1) + jitter,
+            pressure=pressure,
+            offsets=offsets
+        )
+
+    def generate_batch(self, token_lists: List[List[int]], style_embeddings: List) -> List[List[Dict]]:
+        """Generate strokes for several token lists in one forward pass.
+
+        Token lists are right-padded with ``PAD_TOKEN`` into a ``(B, T)`` tensor
+        and run with the stacked ``(B, 512)`` style embeddings under
+        ``torch.inference_mode()``. The model is expected to return
+        ``(B, T, P, 3)`` ``[x, y, pressure]`` points per token; padding is
+        dropped when results are scattered back per request. Without a loaded
+        model each list falls back to ``generate``.
+        """
+        if not HAS_TORCH or self.model is None:
+            return [self.generate(tokens, emb) for tokens, emb in zip(token_lists, style_embeddings)]
+
+        width = max((len(tokens) for tokens in token_lists), default=0)
+        padded = np.full((len(token_lists), width), PAD_TOKEN, dtype=np.int64)
+        for row, tokens in enumerate(token_lists):
+            padded[row, :len(tokens)] = tokens
+        styles = np.stack([np.asarray(emb, dtype=np.float32) for emb in style_embeddings])
+
+        with torch.inference_mode():
+            out = self.model(
+                torch.from_numpy(padded).to(self.device),
+                torch.from_numpy(styles).to(self.device)
+            )
+        out = out.to("cpu").numpy()
+
+        results: List[List[Dict]] = []
+        for row, tokens in enumerate(token_lists):
+            strokes: List[Dict] = []
+            for col, tok in enumerate(tokens):
+                if tok < 0:
+                    strokes.append({"type": "special", "token": tok, "points": []})
+                    continue
+                points = [
+                    {"x": x, "y": y, "pressure": p}
+                    for x, y, p in out[row, col].tolist()
+                ]
+                strokes.append({"type": "glyph", "character": chr(tok), "points": points})
+            results.append(strokes)
+        return results
@@ -6,6 +6,8 @@ Replace with actual encoder weights and preprocessing when available.
 import numpy as np
 from typing import Any, List, Optional
 
+from app.models.registry import model_registry
+
 try:
     import torch
     HAS_TORCH = True
@@ -19,13 +21,13 @@ class StyleEncoder:
     def __init__(self, model_path: Optional[str] = None, device: str = "cpu"):
         self.model_path = model_path
         self.device = device
-        self.model: Optional[Any] = None
-        if HAS_TORCH and model_path:
-            try:
-                self.model = torch.jit.load(model_path, map_location=device)
-                self.model.eval()
-            except Exception:
-                self.model = None
+        # Shared, warmed-up handle; None keeps stub behavior
+        self.model: Optional[Any] = model_registry.load(model_path, device, self.warmup_inputs)
+
+    @staticmethod
+    def warmup_inputs():
+        """Dummy single grayscale sample used to warm the model up after loading."""
+        return (torch.zeros((1, 1, 64, 256)),)
 
     def encode(self, images: List[str]) -> np.ndarray:
         """Return a 512-d embedding; real impl should use vision/stroke features."""
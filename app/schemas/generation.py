@@ -38,6 +38,8 @@ class JobStatus(str, Enum):
 class PageSettings(BaseModel):
     """Page layout and template settings."""
     template: PageTemplate = PageTemplate.RULED
+    page_width_mm: float = 210.0  # A4
+    page_height_mm: float = 297.0
     margin_top_mm: float = 20.0
     margin_bottom_mm: float = 20.0
     margin_left_mm: float = 20.0
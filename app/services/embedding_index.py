@@ -0,0 +1,185 @@
+# app/services/embedding_index.py
+"""Nearest-neighbour search over style embeddings (cosine similarity).
+
+Two backends share one interface:
+
+* ``BruteForceIndex`` keeps every vector as normalized float32 rows and scores
+  a query with a single matrix product. Exact, and fast up to tens of
+  thousands of styles.
+* ``IVFIndex`` clusters vectors with k-means into inverted lists and stores
+  each vector as int8 codes (symmetric per-dimension scale). A query only
+  scores the ``nprobe`` closest lists, so cost grows with the probed lists
+  rather than the catalog. Memory is a quarter of float32.
+
+``build_index`` picks the backend from the catalog size.
+"""
+import logging
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+class BruteForceIndex:
+    """Exact cosine search with one float32 matrix product per query batch."""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._ids: List[Hashable] = []
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, ids: Sequence[Hashable], vectors: np.ndarray) -> None:
+        vectors = _normalize(vectors)
+        needed = self._size + len(vectors)
+        if needed > len(self._vectors):
+            # grow geometrically so repeated adds stay amortized O(1)
+            grown = np.zeros((max(needed, 2 * len(self._vectors), 64), self.dim), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+        self._vectors[self._size:needed] = vectors
+        self._ids.extend(ids)
+        self._size = needed
+
+    def remove(self, id_: Hashable) -> bool:
+        try:
+            i = self._ids.index(id_)
+        except ValueError:
+            return False
+        last = self._size - 1
+        # swap with the last row
+        self._vectors[i] = self._vectors[last]
+        self._ids[i] = self._ids[last]
+        self._ids.pop()
+        self._size = last
+        return True
+
+    def search(self, query: np.ndarray, k: int = 5) -> List[List[Tuple[Hashable, float]]]:
+        """Top ``k`` ``(id, cosine)`` for each query row."""
+        q = _normalize(query)
+        scores = q @ self._vectors[:self._size].T
+        return [[(self._ids[j], float(row[j])) for j in _top_k(row, k)] for row in scores]
+
+
+class IVFIndex:
+    """Inverted-file index with int8-quantized vectors; call ``train`` before ``add``."""
+
+    def __init__(self, dim: int = 512, nlist: int = 64, nprobe: int = 8, seed: int = 0):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.scale = np.ones(dim, dtype=np.float32)
+        self._codes: List[np.ndarray] = []
+        self._ids: List[List[Hashable]] = []
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._ids)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray, iterations: int = 10) -> None:
+        """Spherical k-means for the coarse centroids, and the int8 scale per dimension."""
+        x = _normalize(vectors)
+        nlist = min(self.nlist, len(x))
+        rng = np.random.default_rng(self.seed)
+        centroids = x[rng.choice(len(x), nlist, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(x @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, x)
+            counts = np.bincount(assign, minlength=nlist)
+            # empty lists keep their previous centroid
+            centroids = np.where(counts[:, None] > 0, _normalize(sums), centroids)
+        self.centroids = centroids
+        self.nlist = nlist
+        self.scale = np.maximum(np.abs(x).max(axis=0), 1e-6).astype(np.float32) / 127.0
+        self._codes = [np.zeros((0, self.dim), dtype=np.int8) for _ in range(nlist)]
+        self._ids = [[] for _ in range(nlist)]
+
+    def add(self, ids: Sequence[Hashable], vectors: np.ndarray) -> None:
+        if not self.is_trained:
+            raise RuntimeError("IVFIndex must be trained before adding vectors")
+        x = _normalize(vectors)
+        assign = np.argmax(x @ self.centroids.T, axis=1)
+        codes = np.clip(np.rint(x / self.scale), -127, 127).astype(np.int8)
+        ids = list(ids)
+        for lst in np.unique(assign).tolist():
+            rows = np.flatnonzero(assign == lst)
+            self._codes[lst] = np.concatenate([self._codes[lst], codes[rows]])
+            self._ids[lst].extend(ids[r] for r in rows.tolist())
+
+    def remove(self, id_: Hashable) -> bool:
+        for lst, ids in enumerate(self._ids):
+            if id_ in ids:
+                i = ids.index(id_)
+                ids.pop(i)
+                self._codes[lst] = np.delete(self._codes[lst], i, axis=0)
+                return True
+        return False
+
+    def search(self, query: np.ndarray, k: int = 5) -> List[List[Tuple[Hashable, float]]]:
+        """Approximate top ``k`` ``(id, cosine)`` for each query row."""
+        q = _normalize(query)
+        results = []
+        for row in q:
+            probe = _top_k(row @ self.centroids.T, self.nprobe)
+            codes = [self._codes[lst] for lst in probe.tolist()]
+            ids = [i for lst in probe.tolist() for i in self._ids[lst]]
+            if not ids:
+                results.append([])
+                continue
+            # fold the dequantization scale into the query once
+            scores = np.concatenate(codes).astype(np.float32) @ (row * self.scale)
+            results.append([(ids[j], float(scores[j])) for j in _top_k(scores, k)])
+        return results
+
+
+def build_index(ids: Sequence[Hashable], vectors: np.ndarray, dim: int = 512, backend: str = "auto"):
+    """Index ``vectors`` with brute force, or IVF once the catalog passes ``settings.embedding_ivf_threshold``."""
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, dim)
+    if backend == "auto":
+        backend = "ivf" if len(vectors) >= settings.embedding_ivf_threshold else "brute"
+    if backend == "brute":
+        index = BruteForceIndex(dim)
+    elif backend == "ivf":
+        index = IVFIndex(
+            dim,
+            nlist=max(1, int(np.sqrt(len(vectors)))),
+            nprobe=settings.embedding_ivf_nprobe
+        )
+        index.train(vectors)
+    else:
+        raise ValueError(f"Unknown index backend: {backend}")
+    if len(vectors):
+        index.add(ids, vectors)
+    return index
+
+
+def near_duplicates(index, query: np.ndarray, threshold: float = 0.97, k: int = 10) -> List[Tuple[Hashable, float]]:
+    """Entries whose cosine similarity to ``query`` is at least ``threshold``."""
+    return [(id_, score) for id_, score in index.search(query, k)[0] if score >= threshold]
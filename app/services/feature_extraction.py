@@ -0,0 +1,192 @@
+# app/services/feature_extraction.py
+"""Per-sample handwriting feature extraction on a bounded process pool.
+
+OpenCV work on a sample page is CPU-bound, so each sample is handled by
+``extract_sample_features`` in a worker process and the per-sample results are
+merged afterwards. The pool is shared by the whole process and sized by
+``settings.feature_workers`` (one worker per core by default) and started
+with the ``spawn`` method, so workers never inherit the server's threads,
+locks or open connections. ``app.ai``'s StrokeEngine extracts on the same
+pool with the same contour code (``extract_ink_contours``).
+
+Each sample's result is saved once as an ``.npz`` artifact under
+``settings.features_dir`` and loaded from there on later runs, so retraining
+only pays for samples it has not seen before.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def extract_sample_features(image_path: str) -> Dict:
+    """Strokes, baseline, slant and ink density of one sample image (runs in a worker)."""
+    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return {"strokes": [], "baseline": None, "slant_angle": None, "pressure": None}
+    return extract_image_features(img)
+
+
+def extract_ink_contours(img: np.ndarray) -> Tuple[np.ndarray, List[Dict]]:
+    """Ink mask and one simplified outline per connected ink region of a grayscale page.
+
+    Each outline has ``points`` (float32, N x 2), ``bbox`` (x0, y0, x1, y1) and
+    ``closed`` (whether the simplified polygon is convex).
+    """
+    _, ink = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(ink, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    outlines = []
+    for cnt in contours:
+        epsilon = 0.01 * cv2.arcLength(cnt, True)
+        approx = cv2.approxPolyDP(cnt, epsilon, True)
+        points = approx.reshape(-1, 2).astype(np.float32)
+        if not len(points):
+            continue
+        x, y, w, h = cv2.boundingRect(cnt)
+        outlines.append({
+            "points": points,
+            "bbox": (int(x), int(y), int(x + w), int(y + h)),
+            "closed": bool(cv2.isContourConvex(approx))
+        })
+    return ink, outlines
+
+
+def extract_file_contours(image_path: str) -> List[Dict]:
+    """``extract_ink_contours`` of an image file (runs in a worker); [] if unreadable."""
+    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return []
+    return extract_ink_contours(img)[1]
+
+
+def extract_image_features(img: np.ndarray) -> Dict:
+    """Same as extract_sample_features, for an already decoded grayscale page."""
+    features = {"strokes": [], "baseline": None, "slant_angle": None, "pressure": None}
+    ink, outlines = extract_ink_contours(img)
+    bottoms = []
+    for outline in outlines:
+        features["strokes"].append({"points": outline["points"], "bbox": outline["bbox"]})
+        bottoms.append(outline["bbox"][3])
+    if bottoms:
+        features["baseline"] = float(np.median(bottoms))
+    # slant from the ink's second-order moments (0 = upright, positive = leaning right)
+    m = cv2.moments(ink, binaryImage=True)
+    if m["mu02"] > 0:
+        features["slant_angle"] = float(np.degrees(np.arctan2(-m["mu11"], m["mu02"])))
+    mask = ink > 0
+    if mask.any():
+        features["pressure"] = float(1.0 - img[mask].mean() / 255.0)
+    return features
+
+
+SCALAR_FEATURES = ("baseline", "slant_angle", "pressure")
+
+
+def artifact_path(sample_id: str) -> str:
+    return os.path.join(settings.features_dir, f"{os.path.basename(sample_id)}.npz")
+
+
+def save_sample_features(path: str, features: Dict) -> None:
+    """Write one sample's features as packed arrays (strokes as points + offsets)."""
+    strokes = features["strokes"]
+    counts = [len(s["points"]) for s in strokes]
+    np.savez(
+        path,
+        points=np.concatenate([s["points"] for s in strokes]) if strokes else np.zeros((0, 2), np.float32),
+        offsets=np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+        bbox=np.array([s["bbox"] for s in strokes], dtype=np.int64).reshape(-1, 4),
+        scalars=np.array([np.nan if features[k] is None else features[k] for k in SCALAR_FEATURES])
+    )
+
+
+def load_sample_features(path: str) -> Dict:
+    with np.load(path) as data:
+        points, offsets, bbox, scalars = data["points"], data["offsets"], data["bbox"], data["scalars"]
+    features = {k: None if np.isnan(v) else float(v) for k, v in zip(SCALAR_FEATURES, scalars)}
+    features["strokes"] = [
+        {"points": points[offsets[i]:offsets[i + 1]], "bbox": tuple(int(v) for v in bbox[i])}
+        for i in range(len(bbox))
+    ]
+    return features
+
+
+def sample_features(image_path: str, cache_path: Optional[str] = None) -> Dict:
+    """Load the sample's saved artifact, or extract its features and save them (runs in a worker)."""
+    if cache_path and os.path.exists(cache_path):
+        try:
+            return load_sample_features(cache_path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable feature artifact {cache_path}: {e}")
+    features = extract_sample_features(image_path)
+    # nothing worth caching for a sample that could not be read
+    if cache_path and features["strokes"]:
+        save_sample_features(cache_path, features)
+    return features
+
+
+def feature_stats(per_sample: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """Mean and count of each scalar feature over the samples that have it."""
+    stats = {}
+    for key in SCALAR_FEATURES:
+        values = [f[key] for f in per_sample if f.get(key) is not None]
+        stats[key] = {"mean": float(np.mean(values)) if values else 0.0, "count": len(values)}
+    return stats
+
+
+def merge_running_stats(current: Dict, new: Dict) -> Dict[str, Dict[str, float]]:
+    """Combine two ``feature_stats`` results with count-weighted running means."""
+    merged = {}
+    for key in set(current) | set(new):
+        a = current.get(key, {"mean": 0.0, "count": 0})
+        b = new.get(key, {"mean": 0.0, "count": 0})
+        count = a["count"] + b["count"]
+        mean = (a["mean"] * a["count"] + b["mean"] * b["count"]) / count if count else 0.0
+        merged[key] = {"mean": float(mean), "count": count}
+    return merged
+
+
+def merge_sample_features(per_sample: List[Dict], sample_ids: List[str]) -> Dict:
+    """Combine per-sample results into the feature dict ``StyleService`` works with."""
+    stats = feature_stats(per_sample)
+    return {
+        "strokes": [{"sample_id": sid, "strokes": f["strokes"]} for sid, f in zip(sample_ids, per_sample)],
+        "baseline": stats["baseline"]["mean"],
+        "slant_angle": stats["slant_angle"]["mean"],
+        "pressure_profiles": [f["pressure"] for f in per_sample if f.get("pressure") is not None],
+        "character_segments": {},
+        "stats": stats
+    }
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_feature_pool() -> ProcessPoolExecutor:
+    """Return the process-wide feature pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        workers = settings.feature_workers or os.cpu_count() or 1
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def extract_features_parallel(samples: List[Tuple[str, str]]) -> List[Dict]:
+    """Features for ``(sample_id, image_path)`` pairs on the pool (artifacts reused), in input order."""
+    jobs = [(path, artifact_path(sid)) for sid, path in samples]
+    if len(jobs) <= 1:
+        # not worth a process hop
+        return [sample_features(*job) for job in jobs]
+    loop = asyncio.get_running_loop()
+    pool = get_feature_pool()
+    return list(await asyncio.gather(*[
+        loop.run_in_executor(pool, sample_features, *job) for job in jobs
+    ]))
@@ -3,10 +3,15 @@
 
 import os
 import uuid
+import json
+import asyncio
+import hashlib
+import time
 import numpy as np
 import logging
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
 # Optional torch import
 try:
@@ -16,16 +21,52 @@ except ImportError:
     HAS_TORCH = False
 
 from app.core.config import settings
+from app.core.glyph_cache import GlyphVariants, glyph_cache, pen_key, style_key
+from app.models.inference_batcher import get_stroke_batcher
+from app.models.stroke_batch import NEWLINE_CODE, SPACE_CODE, StrokeBatch
+from app.services.diffusion_engine import quality_engine
 
 logger = logging.getLogger(__name__)
 
 
+def generation_fingerprint(
+    style_ref: str,
+    text: str,
+    pen_settings: Optional[Dict] = None,
+    page_settings: Optional[Dict] = None,
+    mode: str = "fast"
+) -> str:
+    """Deterministic content address of a generation request.
+    
+    ``style_ref`` should identify the style *version* (e.g. ``"<id>:<version>"``)
+    so retraining a style never serves stale results.
+    """
+    payload = json.dumps(
+        {
+            "style": style_ref,
+            "text": text,
+            "pen": pen_settings or {},
+            "page": page_settings or {},
+            "mode": mode
+        },
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 class GenerationService:
     """Core text-to-handwriting generation engine."""
 
     def __init__(self):
         self.device = settings.device
         self.max_sequence_length = 1024
+        self.page_dpi = 150  # A4 renders at 1240x1754 px
+        # Completed results by request fingerprint, and runs still in flight
+        self._result_cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.result_cache_hits = 0
+        self.result_cache_misses = 0
         
     async def generate_handwriting(
         self,
@@ -33,7 +74,9 @@ class GenerationService:
         text: str,
         pen_settings: Optional[Dict] = None,
         page_settings: Optional[Dict] = None,
-        mode: str = "fast"
+        mode: str = "fast",
+        include_points: bool = False,
+        fingerprint: Optional[str] = None
     ) -> Dict:
         """Generate handwriting from text using a style.
         
@@ -43,10 +86,81 @@ class GenerationService:
             pen_settings: Pen customization
             page_settings: Page layout settings
             mode: "fast" (autoregressive) or "quality" (diffusion)
+            include_points: Expand the stroke batch into per-point dicts on
+                each page (only needed by clients that consume JSON strokes)
+            fingerprint: Request fingerprint from ``generation_fingerprint``.
+                When given, generation is seeded from it, completed results
+                are served from the result cache and identical in-flight
+                requests share one computation
             
         Returns:
             Generated strokes and page layout
         """
+        if fingerprint is None:
+            result = await self._generate(style_embedding, text, pen_settings, page_settings, mode)
+        else:
+            result = await self._generate_deduplicated(
+                fingerprint, style_embedding, text, pen_settings, page_settings, mode
+            )
+        
+        if include_points:
+            batch = result["stroke_batch"]
+            result = {
+                **result,
+                "pages": [
+                    {**page, "strokes": batch.to_dicts(batch.glyphs_on_page(page["page_number"]))}
+                    for page in result["pages"]
+                ]
+            }
+        return result
+
+    async def _generate_deduplicated(
+        self,
+        fingerprint: str,
+        style_embedding: np.ndarray,
+        text: str,
+        pen_settings: Optional[Dict],
+        page_settings: Optional[Dict],
+        mode: str
+    ) -> Dict:
+        """Serve a fingerprinted request from cache, an in-flight twin, or a new run."""
+        cached = self._result_cache.get(fingerprint)
+        if cached is not None:
+            self._result_cache.move_to_end(fingerprint)
+            self.result_cache_hits += 1
+            return cached
+        
+        task = self._inflight.get(fingerprint)
+        if task is None:
+            self.result_cache_misses += 1
+            rng = np.random.default_rng(int(fingerprint[:16], 16))
+            task = asyncio.ensure_future(
+                self._generate(style_embedding, text, pen_settings, page_settings, mode, rng)
+            )
+            self._inflight[fingerprint] = task
+            task.add_done_callback(lambda t: self._finish_inflight(fingerprint, t))
+        # Shielded so one caller going away does not cancel the shared run
+        return await asyncio.shield(task)
+
+    def _finish_inflight(self, fingerprint: str, task: asyncio.Future) -> None:
+        self._inflight.pop(fingerprint, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._result_cache[fingerprint] = task.result()
+        while len(self._result_cache) > settings.result_cache_size:
+            self._result_cache.popitem(last=False)
+
+    async def _generate(
+        self,
+        style_embedding: np.ndarray,
+        text: str,
+        pen_settings: Optional[Dict] = None,
+        page_settings: Optional[Dict] = None,
+        mode: str = "fast",
+        rng: Optional[np.random.Generator] = None
+    ) -> Dict:
+        """Run tokenization, stroke generation, layout and pagination."""
+        deadline = time.monotonic() + settings.generation_timeout_seconds
         logger.info(f"Generating handwriting: {len(text)} chars, mode={mode}")
         
         try:
@@ -55,45 +169,104 @@ class GenerationService:
             
             # Generate strokes based on mode
             if mode == "quality":
-                strokes = await self._generate_strokes_diffusion(tokens, style_embedding)
+                batch = await self._generate_strokes_diffusion(
+                    tokens, style_embedding, pen_settings, rng=rng, deadline=deadline
+                )
             else:
-                strokes = await self._generate_strokes_autoregressive(tokens, style_embedding)
+                batch = await self._generate_strokes_autoregressive(tokens, style_embedding, pen_settings, rng=rng)
             
             # Apply layout
-            layout_strokes = await self._apply_layout_and_style(
-                strokes,
+            batch = await self._apply_layout_and_style(
+                batch,
                 style_embedding,
                 pen_settings or {},
                 page_settings or {}
             )
             
             # Paginate
-            pages = await self._paginate_strokes(layout_strokes)
+            pages = await self._paginate_strokes(batch, page_settings or {})
             
             result = {
                 "text": text,
-                "stroke_count": len(strokes),
+                "stroke_count": batch.glyph_count,
                 "page_count": len(pages),
                 "pages": pages,
+                "stroke_batch": batch,
                 "mode": mode,
                 "generated_at": datetime.utcnow().isoformat()
             }
             
-            logger.info(f"Generated {len(pages)} pages")
+            logger.info(f"Generated {len(pages)} pages ({batch.nbytes} bytes of stroke data)")
             return result
             
         except Exception as e:
             logger.error(f"Generation failed: {e}", exc_info=True)
             raise
 
+    async def generate_handwriting_stream(
+        self,
+        style_embedding: np.ndarray,
+        text: str,
+        pen_settings: Optional[Dict] = None,
+        page_settings: Optional[Dict] = None,
+        mode: str = "fast",
+        include_points: bool = False
+    ) -> AsyncIterator[Dict]:
+        """Generate handwriting page by page.
+        
+        The text is cut into page-sized runs of lines up front, and each run
+        goes through generation, layout and pagination on its own before the
+        page is yielded. Only one page of strokes is alive at a time.
+        
+        Yields:
+            One page dict per page, carrying ``strokes`` (per-point dicts) when
+            ``include_points`` is set and a packed ``stroke_batch`` payload
+            otherwise
+        """
+        pen_settings = pen_settings or {}
+        page_settings = page_settings or {}
+        deadline = time.monotonic() + settings.generation_timeout_seconds
+        geometry = self._page_geometry(page_settings)
+        lines_per_page = self._lines_per_page(geometry)
+        
+        lines = text.split("\n")
+        # Trailing blank lines never produce a page
+        while lines and not lines[-1].strip():
+            lines.pop()
+        logger.info(f"Streaming handwriting: {len(text)} chars, mode={mode}")
+        
+        for page_number, start in enumerate(range(0, len(lines), lines_per_page)):
+            tokens = await self._tokenize_text("\n".join(lines[start:start + lines_per_page]))
+            
+            if mode == "quality":
+                batch = await self._generate_strokes_diffusion(
+                    tokens, style_embedding, pen_settings, deadline=deadline
+                )
+            else:
+                batch = await self._generate_strokes_autoregressive(tokens, style_embedding, pen_settings)
+            batch = await self._apply_layout_and_style(batch, style_embedding, pen_settings, page_settings)
+            pages = await self._paginate_strokes(batch, page_settings)
+            
+            page = {
+                "page_number": page_number,
+                "glyph_count": pages[0]["glyph_count"] if pages else 0,
+                "height": geometry["height"],
+                "width": geometry["width"]
+            }
+            if include_points:
+                page["strokes"] = batch.to_dicts(batch.glyphs_on_page(0))
+            else:
+                page["stroke_batch"] = batch.to_packed_dict()
+            yield page
+
     async def _tokenize_text(self, text: str) -> List[int]:
         """Convert text to tokens."""
         tokens = []
         for char in text:
             if char == '\n':
-                tokens.append(-1)  # NEWLINE token
+                tokens.append(NEWLINE_CODE)  # NEWLINE token
             elif char == ' ':
-                tokens.append(-2)  # SPACE token
+                tokens.append(SPACE_CODE)  # SPACE token
             else:
                 tokens.append(ord(char) % 256)
         return tokens
@@ -101,120 +274,222 @@ class GenerationService:
     async def _generate_strokes_autoregressive(
         self,
         tokens: List[int],
-        style_embedding: np.ndarray
-    ) -> List[Dict]:
-        """Fast autoregressive stroke generation."""
-        strokes = []
-        
-        for i, token in enumerate(tokens):
-            # Generate stroke for this token
-            if token < 0:
-                # Special token (space, newline)
-                strokes.append({
-                    "type": "space" if token == -2 else "newline",
-                    "points": []
-                })
-            else:
-                # Regular character
-                num_points = np.random.randint(5, 20)
-                points = [
-                    {
-                        "x": float(x),
-                        "y": float(y),
-                        "pressure": float(p)
-                    }
-                    for x, y, p in zip(
-                        np.linspace(0, 10, num_points),
-                        np.linspace(0, 20, num_points) + np.random.randn(num_points) * 2,
-                        np.random.uniform(0.5, 1.0, num_points)
-                    )
-                ]
-                
-                strokes.append({
-                    "type": "glyph",
-                    "character": chr(token),
-                    "points": points
-                })
+        style_embedding: np.ndarray,
+        pen_settings: Optional[Dict] = None,
+        variant_seed: int = 0,
+        rng: Optional[np.random.Generator] = None
+    ) -> StrokeBatch:
+        """Fast autoregressive stroke generation.
+        
+        Each distinct character is served from the process-wide glyph cache,
+        which keeps a small pool of pre-generated variants per style,
+        character, variant seed and pen settings. Characters missing from the
+        cache are generated in one request to the shared stroke inference
+        batcher, so concurrent documents share a forward pass. Every
+        occurrence picks one variant from its pool and the picks are gathered
+        into a ``StrokeBatch`` with a few batched NumPy calls. Variant picks
+        come from ``rng``, so a seeded generator makes the output reproducible.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        codes = np.asarray(tokens, dtype=np.int32)
+        style = style_key(style_embedding)
+        pen = pen_key(pen_settings)
+        
+        distinct, glyph_pool = np.unique(codes, return_inverse=True)
+        keys = {code: ("autoregressive", style, code, variant_seed, pen) for code in distinct.tolist() if code >= 0}
+        cached = {code: glyph_cache.get(key) for code, key in keys.items()}
+        missing = [code for code, pool in cached.items() if pool is None]
+        if missing:
+            generated = await self._generate_variants(missing, style_embedding)
+            for code, pool in generated.items():
+                glyph_cache.put(keys[code], pool)
+                cached[code] = pool
+        pools = [cached.get(code) for code in distinct.tolist()]
+        
+        # Stack every pool used by this document into one variant table
+        pool_sizes = np.array([p.variant_count if p else 0 for p in pools], dtype=np.int64)
+        pool_first = np.cumsum(pool_sizes) - pool_sizes
+        used = [p for p in pools if p]
+        if not used:
+            return StrokeBatch.from_counts(codes, np.zeros(len(codes), dtype=np.int64))
+        table_points = np.concatenate([p.points for p in used])
+        table_pressure = np.concatenate([p.pressure for p in used])
+        variant_lengths = np.concatenate([np.diff(p.offsets) for p in used])
+        variant_start = np.cumsum(variant_lengths) - variant_lengths
         
-        return strokes
+        is_glyph = codes >= 0
+        choice = rng.integers(0, np.maximum(pool_sizes[glyph_pool], 1))
+        variant = np.where(is_glyph, pool_first[glyph_pool] + choice, 0)
+        counts = np.where(is_glyph, variant_lengths[variant], 0)
+        
+        batch = StrokeBatch.from_counts(codes, counts)
+        src = np.arange(batch.point_count) + np.repeat(variant_start[variant] - batch.offsets[:-1], counts)
+        batch.points[:] = table_points[src]
+        batch.pressure[:] = table_pressure[src]
+        return batch
+
+    async def _generate_variants(self, codes: List[int], style_embedding: np.ndarray) -> Dict[int, GlyphVariants]:
+        """Generate a pool of variants for each of ``codes`` with one batched model request.
+        
+        Every code is repeated ``glyph_cache.variants_per_glyph`` times in the
+        token list so the model samples all of a glyph's variants in the same
+        forward pass.
+        """
+        per_glyph = glyph_cache.variants_per_glyph
+        strokes = await get_stroke_batcher().generate(
+            [code for code in codes for _ in range(per_glyph)], style_embedding
+        )
+        pools = {}
+        for i, code in enumerate(codes):
+            variants = [s["points"] for s in strokes[i * per_glyph:(i + 1) * per_glyph]]
+            counts = np.array([len(points) for points in variants], dtype=np.int64)
+            offsets = np.zeros(len(variants) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            flat = [point for points in variants for point in points]
+            pools[code] = GlyphVariants(
+                points=np.array([(p["x"], p["y"]) for p in flat], dtype=np.float32).reshape(-1, 2),
+                pressure=np.array([p["pressure"] for p in flat], dtype=np.float32),
+                offsets=offsets
+            )
+        return pools
 
     async def _generate_strokes_diffusion(
         self,
         tokens: List[int],
-        style_embedding: np.ndarray
-    ) -> List[Dict]:
-        """Quality diffusion-based stroke generation."""
-        # For now, fallback to autoregressive
-        return await self._generate_strokes_autoregressive(tokens, style_embedding)
+        style_embedding: np.ndarray,
+        pen_settings: Optional[Dict] = None,
+        variant_seed: int = 0,
+        rng: Optional[np.random.Generator] = None,
+        deadline: Optional[float] = None
+    ) -> StrokeBatch:
+        """Quality diffusion-based stroke generation.
+        
+        The fast generator's strokes seed a step-budgeted denoising pass on
+        the quality worker pool, which stops early as ``deadline`` (a
+        ``time.monotonic()`` value) approaches.
+        """
+        prior = await self._generate_strokes_autoregressive(
+            tokens, style_embedding, pen_settings, variant_seed, rng
+        )
+        batch, steps_run = await quality_engine.refine(prior, rng, deadline)
+        logger.info(f"Quality mode ran {steps_run}/{quality_engine.steps} denoising steps")
+        return batch
 
     async def _apply_layout_and_style(
         self,
-        strokes: List[Dict],
+        batch: StrokeBatch,
         style_embedding: np.ndarray,
         pen_settings: Dict,
         page_settings: Dict
-    ) -> List[Dict]:
-        """Apply page layout and style to strokes."""
-        margin_top = page_settings.get("margin_top", 50)
-        margin_left = page_settings.get("margin_left", 50)
-        line_height = page_settings.get("line_height", 25)
-        
-        x, y = margin_left, margin_top
-        layout_strokes = []
-        
-        for stroke in strokes:
-            if stroke["type"] == "newline":
-                y += line_height
-                x = margin_left
-            elif stroke["type"] == "space":
-                x += 15
-            else:
-                # Apply position and style
-                for point in stroke["points"]:
-                    point["x"] += x
-                    point["y"] += y
-                    # Apply pressure from pen settings
-                    pressure_mult = pen_settings.get("pressure_multiplier", 1.0)
-                    point["pressure"] *= pressure_mult
-                
-                layout_strokes.append(stroke)
-                x += 12  # Character width
-        
-        return layout_strokes
-
-    async def _paginate_strokes(self, strokes: List[Dict]) -> List[Dict]:
-        """Split strokes into pages."""
-        page_height = 1754  # A4 at 300 DPI
-        page_width = 1240
-        
-        pages = []
-        current_page = {
-            "strokes": [],
-            "height": page_height,
-            "width": page_width
-        }
+    ) -> StrokeBatch:
+        """Apply page layout and style to the stroke batch (in place).
         
-        current_y = 0
-        for stroke in strokes:
-            max_y = max(p["y"] for p in stroke["points"]) if stroke["points"] else 0
-            
-            if max_y > page_height:
-                # Start new page
-                pages.append(current_page)
-                current_page = {
-                    "strokes": [],
-                    "height": page_height,
-                    "width": page_width
-                }
-                current_y = 0
-            
-            current_page["strokes"].append(stroke)
-            current_y = max(current_y, max_y)
+        Layout is computed once per document on glyph-sized arrays; the
+        resulting per-glyph offsets and the pressure multiplier are then
+        applied to the point arrays in a single broadcast each.
+        """
+        geometry = self._page_geometry(page_settings)
+        margin_top = geometry["margin_top"]
+        margin_left = geometry["margin_left"]
+        line_height = geometry["line_height"]
+        char_width = 12
+        space_width = 15
+        
+        codes = batch.char_codes
+        is_newline = codes == NEWLINE_CODE
+        advance = np.where(codes >= 0, char_width, np.where(codes == SPACE_CODE, space_width, 0))
+        
+        # Pen position before each glyph, measured from the document start
+        pen_x = np.cumsum(advance) - advance
+        line_id = self._line_ids(codes)
+        # Every line restarts at the pen position of its first glyph
+        line_start = pen_x[np.concatenate(([0], np.flatnonzero(is_newline)))] if len(codes) else pen_x
+        
+        glyph_xy = np.empty((len(codes), 2), dtype=np.float32)
+        glyph_xy[:, 0] = margin_left + pen_x - line_start[line_id]
+        glyph_xy[:, 1] = margin_top + line_id * line_height
+        
+        batch.points += np.repeat(glyph_xy, batch.point_counts(), axis=0)
+        batch.pressure *= pen_settings.get("pressure_multiplier", 1.0)
+        return batch
+
+    async def _paginate_strokes(self, batch: StrokeBatch, page_settings: Dict) -> List[Dict]:
+        """Assign whole lines to pages and reset y per page.
+        
+        Page breaks are found with one ``searchsorted`` over line tops, so the
+        cost is a single pass over lines. Fills ``batch.page_index`` and moves
+        every glyph's y into its own page's coordinate system.
+        """
+        geometry = self._page_geometry(page_settings)
+        margin_top = geometry["margin_top"]
+        line_height = geometry["line_height"]
+        page_span = self._lines_per_page(geometry) * line_height
+        
+        line_id = self._line_ids(batch.char_codes)
+        drawn = (batch.char_codes >= 0) & (batch.point_counts() > 0)
+        if not drawn.any():
+            batch.page_index[:] = 0
+            return []
         
-        if current_page["strokes"]:
-            pages.append(current_page)
+        line_count = int(line_id[-1]) + 1
+        line_top = margin_top + np.arange(line_count) * line_height
+        page_count = int((line_top[-1] - margin_top) // page_span) + 1
+        page_breaks = margin_top + np.arange(1, page_count) * page_span
+        page_of_line = np.searchsorted(page_breaks, line_top, side="right").astype(np.int32)
         
-        return pages
+        batch.page_index[:] = page_of_line[line_id]
+        page_shift = (batch.page_index * page_span).astype(np.float32)
+        batch.points[:, 1] -= np.repeat(page_shift, batch.point_counts())
+        
+        page_count = int(batch.page_index[drawn].max()) + 1
+        glyph_counts = np.bincount(batch.page_index[drawn], minlength=page_count)
+        return [
+            {
+                "page_number": page,
+                "glyph_count": int(glyph_counts[page]),
+                "height": geometry["height"],
+                "width": geometry["width"]
+            }
+            for page in range(page_count)
+        ]
+
+    def _lines_per_page(self, geometry: Dict[str, float]) -> int:
+        """Number of whole lines that fit between the top and bottom margins."""
+        usable_height = geometry["height"] - geometry["margin_top"] - geometry["margin_bottom"]
+        return max(1, int(usable_height // geometry["line_height"]))
+
+    def _line_ids(self, codes: np.ndarray) -> np.ndarray:
+        """Line number of every glyph (a newline opens the next line)."""
+        return np.cumsum(codes == NEWLINE_CODE)
+
+    def _page_geometry(self, page_settings: Dict) -> Dict[str, float]:
+        """Resolve page size, margins and line height in pixels.
+        
+        Accepts the millimetre fields of ``PageSettings`` (``margin_*_mm``,
+        ``line_spacing_mm``, ``page_width_mm``/``page_height_mm``) and falls
+        back to the legacy pixel keys (``margin_top``, ``line_height``, ...).
+        """
+        px_per_mm = page_settings.get("dpi", self.page_dpi) / 25.4
+        
+        def length(key: str, default_px: float) -> float:
+            if f"{key}_mm" in page_settings:
+                return float(page_settings[f"{key}_mm"]) * px_per_mm
+            return float(page_settings.get(key, default_px))
+        
+        margin_top = length("margin_top", 50)
+        if "line_spacing_mm" in page_settings:
+            line_height = float(page_settings["line_spacing_mm"]) * px_per_mm
+        else:
+            line_height = page_settings.get("line_height", 25)
+        return {
+            "width": length("page_width", round(210 * px_per_mm)),
+            "height": length("page_height", round(297 * px_per_mm)),
+            "margin_top": margin_top,
+            "margin_bottom": length("margin_bottom", margin_top),
+            "margin_left": length("margin_left", 50),
+            "margin_right": length("margin_right", 50),
+            "line_height": float(line_height)
+        }
 
     async def generate_with_equations(
         self,
@@ -14,19 +14,41 @@ class ImageProcessor:
         os.makedirs(self.tmp_dir, exist_ok=True)
 
     async def process_image(self, image_path: str) -> str:
-        img = cv2.imread(image_path)
+        img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
         if img is None:
             raise FileNotFoundError(f"Image not found: {image_path}")
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        deskewed = self._deskew_image(gray)
-        cropped = self._auto_crop(deskewed)
-        enhanced = self._enhance_contrast(cropped)
-        binary = self._binarize(enhanced)
+        binary = self.process_array(img)
 
         processed_path = image_path.rsplit(".", 1)[0] + "_processed.png"
         cv2.imwrite(processed_path, binary)
         return processed_path
 
+    @staticmethod
+    def decode_image(data: bytes) -> np.ndarray:
+        """Decode an encoded image buffer (JPEG/PNG/WebP) straight to grayscale, once."""
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise ValueError("Could not decode image data")
+        return img
+
+    @staticmethod
+    def encode_png(image: np.ndarray) -> bytes:
+        ok, buf = cv2.imencode(".png", image)
+        if not ok:
+            raise ValueError("Could not encode image as PNG")
+        return buf.tobytes()
+
+    def process_array(self, gray: np.ndarray) -> np.ndarray:
+        """Deskew, crop, enhance and binarize a grayscale page entirely in memory."""
+        deskewed = self._deskew_image(gray)
+        cropped = self._auto_crop(deskewed)
+        enhanced = self._enhance_contrast(cropped)
+        return self._binarize(enhanced)
+
+    def process_bytes(self, data: bytes) -> np.ndarray:
+        """Bytes in, binarized array out: the upload path, with no temp files."""
+        return self.process_array(self.decode_image(data))
+
     def _deskew_image(self, image: np.ndarray) -> np.ndarray:
         edges = cv2.Canny(image, 50, 150, apertureSize=3)
         lines = cv2.HoughLines(edges, 1, np.pi / 180, 100)
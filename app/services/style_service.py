@@ -8,6 +8,7 @@ from datetime import datetime
 from collections import defaultdict
 import logging
 import os
+import cv2
 
 # Optional torch import
 try:
@@ -17,7 +18,10 @@ except ImportError:
     HAS_TORCH = False
 
 from app.services.image_processor import ImageProcessor
+from app.utils.align import align_components, group_by_character
+from app.services.feature_extraction import extract_features_parallel, merge_sample_features, merge_running_stats
 from app.core.config import settings
+from app.core.embedding_store import decode_embedding, encode_embedding
 
 logger = logging.getLogger(__name__)
 
@@ -59,6 +63,8 @@ class StyleService:
             
             # Build character database
             char_db = await self._build_character_database(samples, features)
+            if not char_db:
+                char_db = self._placeholder_character_database()
             
             # Extract ligatures
             ligatures = await self._extract_ligatures(samples)
@@ -68,7 +74,7 @@ class StyleService:
                 "style_id": style_id,
                 "user_id": user_id,
                 "name": style_name,
-                "embedding": embedding.tobytes().hex() if isinstance(embedding, np.ndarray) else str(embedding),
+                "embedding": encode_embedding(embedding, settings.embedding_dtype),
                 "embedding_dim": self.embedding_dim,
                 "parameters": params,
                 "character_database": char_db,
@@ -76,6 +82,7 @@ class StyleService:
                 "processing_mode": processing_mode,
                 "created_at": datetime.utcnow().isoformat(),
                 "sample_count": len(samples),
+                "feature_stats": features["stats"],
                 "covered_glyphs": list(char_db.keys()),
                 "metadata": {
                     "slant_angle_deg": params.get("slant_angle", 0),
@@ -98,19 +105,9 @@ class StyleService:
         return [{"id": sid, "path": f"/samples/{sid}.png"} for sid in sample_ids]
 
     async def _extract_features(self, samples: List[Dict]) -> Dict:
-        """Extract handwriting features from samples."""
-        features = {
-            "strokes": [],
-            "baseline": 0.0,
-            "slant_angle": 0.0,
-            "pressure_profiles": [],
-            "character_segments": {}
-        }
-        
-        for sample in samples:
-            features["strokes"].append({"points": []})
-            
-        return features
+        """Extract handwriting features from samples, one worker process per sample."""
+        per_sample = await extract_features_parallel([(s["id"], s["path"]) for s in samples])
+        return merge_sample_features(per_sample, [s["id"] for s in samples])
 
     async def _compute_embedding(self, features: Dict) -> np.ndarray:
         """Compute style embedding vector."""
@@ -135,8 +132,38 @@ class StyleService:
         }
 
     async def _build_character_database(self, samples: List[Dict], features: Dict) -> Dict:
-        """Build character variant database from samples."""
-        char_db = {
+        """Build character variant database by aligning each sample's components to its transcription."""
+        char_db = {}
+        strokes_by_sample = {f["sample_id"]: f["strokes"] for f in features.get("strokes", [])}
+        for sample in samples:
+            text = sample.get("transcription") or sample.get("transcript") or ""
+            strokes = strokes_by_sample.get(sample["id"]) or []
+            if not text or not strokes:
+                continue
+            order, char_index = align_components([s["bbox"] for s in strokes], text)
+            for ch, comps in group_by_character(order, char_index, text):
+                parts = [strokes[c] for c in comps]
+                boxes = np.array([p["bbox"] for p in parts])
+                char_db.setdefault(ch, {"variants": []})["variants"].append({
+                    # flat [x0, y0, x1, y1, ...] per component (Firestore has no nested arrays)
+                    "strokes": [{"points": np.asarray(p["points"]).ravel().tolist()} for p in parts],
+                    "bounding_box": [
+                        int(boxes[:, 0].min()), int(boxes[:, 1].min()),
+                        int(boxes[:, 2].max()), int(boxes[:, 3].max())
+                    ],
+                    "frequency": 1.0
+                })
+        
+        for data in char_db.values():
+            boxes = np.array([v["bounding_box"] for v in data["variants"]], dtype=np.float64)
+            data["avg_width"] = float((boxes[:, 2] - boxes[:, 0]).mean())
+            data["avg_height"] = float((boxes[:, 3] - boxes[:, 1]).mean())
+        return char_db
+
+    @staticmethod
+    def _placeholder_character_database() -> Dict:
+        """Placeholder glyphs for a new style whose samples have no transcription."""
+        return {
             chr(i): {
                 "variants": [
                     {
@@ -150,7 +177,6 @@ class StyleService:
             }
             for i in range(ord('a'), ord('z') + 1)
         }
-        return char_db
 
     async def _extract_ligatures(self, samples: List[Dict]) -> Dict:
         """Extract ligature information from samples."""
@@ -166,26 +192,117 @@ class StyleService:
         self, 
         style_id: str,
         additional_sample_ids: List[str],
-        adapter_steps: int = 500
+        adapter_steps: int = 500,
+        profile: Optional[Dict] = None
     ) -> Dict:
-        """Fine-tune style with additional samples."""
+        """Fine-tune style with additional samples.
+
+        Only the new samples are extracted; their glyph variants and statistics are
+        merged into ``profile`` (the stored style) with count-weighted running means.
+        Returns the merged fields to write back.
+        """
         logger.info(f"Retraining style {style_id}")
+        profile = profile or {}
         
         new_samples = await self._load_samples(additional_sample_ids)
         features = await self._extract_features(new_samples)
+        new_char_db = await self._build_character_database(new_samples, features)
+        
+        old_count = profile.get("sample_count", 0)
+        new_count = len(new_samples)
+        char_db = self._merge_character_database(profile.get("character_database") or {}, new_char_db)
+        stats = merge_running_stats(profile.get("feature_stats") or {}, features["stats"])
+        
+        # Embedding: sample-weighted running mean
+        embedding = await self._compute_embedding(features)
+        if profile.get("embedding") and old_count:
+            old = decode_embedding(profile["embedding"], self.embedding_dim)
+            embedding = (old * old_count + embedding * new_count) / (old_count + new_count)
+        
+        params = dict(profile.get("parameters") or {})
+        if stats["slant_angle"]["count"]:
+            params["slant_angle"] = stats["slant_angle"]["mean"]
         
         return {
             "style_id": style_id,
             "status": "retrained",
-            "new_sample_count": len(additional_sample_ids),
+            "new_sample_count": new_count,
+            "sample_count": old_count + new_count,
             "adapter_steps": adapter_steps,
+            "embedding": encode_embedding(embedding, settings.embedding_dtype),
+            "parameters": params,
+            "feature_stats": stats,
+            "character_database": char_db,
+            "covered_glyphs": list(char_db.keys()),
             "updated_at": datetime.utcnow().isoformat()
         }
 
+    @staticmethod
+    def _merge_character_database(current: Dict, new: Dict) -> Dict:
+        """Append new glyph variants per character and update size averages as running means."""
+        merged = dict(current)
+        for ch, entry in new.items():
+            # variants without strokes carry no glyph data (placeholders)
+            variants = [v for v in entry.get("variants", []) if v.get("strokes")]
+            if not variants:
+                continue
+            existing = merged.get(ch)
+            if not existing or not existing.get("variants"):
+                merged[ch] = entry
+                continue
+            n, m = len(existing["variants"]), len(variants)
+            combined = dict(existing)
+            for key in ("avg_width", "avg_height"):
+                combined[key] = (existing.get(key, 0.0) * n + entry.get(key, 0.0) * m) / (n + m)
+            combined["variants"] = existing["variants"] + variants
+            merged[ch] = combined
+        return merged
+
     def train_style(self, style_id: str, samples: List[Dict]):
         """Synchronous method for background task processing."""
         logger.info(f"Training style {style_id}")
 
-    async def generate_preview(self, style: Dict, text: str) -> str:
-        """Generate a preview of text in this style."""
-        return "/previews/sample_preview.png"
+    async def generate_preview(self, style: Dict, text: str) -> bytes:
+        """Generate a preview of text in this style (PNG bytes)."""
+        return self.render_preview(style, text)
+
+    def render_preview(self, style: Dict, text: str, height: Optional[int] = None) -> bytes:
+        """Draw short text straight from the style's glyph strokes into an in-memory PNG.
+
+        Each character uses its first variant, aligned on the bottom of its
+        bounding box and scaled so the style's average glyph height fills about
+        half the image. Characters without stroke data only advance the pen.
+        """
+        height = height or settings.preview_height_px
+        char_db = style.get("character_database") or {}
+        sizes = [d.get("avg_height", 0) for d in char_db.values() if d.get("avg_height")]
+        scale = 0.5 * height / (float(np.median(sizes)) if sizes else 20.0)
+        space = 0.6 * float(np.median([d.get("avg_width", 10.0) for d in char_db.values()] or [10.0]))
+        baseline = 0.75 * height
+        pad = 0.1 * height
+
+        polylines, x = [], pad
+        for ch in text:
+            entry = char_db.get(ch)
+            if ch.isspace() or not entry or not entry.get("variants"):
+                x += (space if ch.isspace() else (entry or {}).get("avg_width", space)) * scale
+                continue
+            variant = entry["variants"][0]
+            x0, _, x1, y1 = variant.get("bounding_box") or [0, 0, entry.get("avg_width", 10.0), 0]
+            for stroke in variant.get("strokes", []):
+                pts = np.asarray(stroke.get("points", []), dtype=np.float64).reshape(-1, 2)
+                if len(pts):
+                    polylines.append(np.column_stack((x + (pts[:, 0] - x0) * scale, baseline + (pts[:, 1] - y1) * scale)))
+            x += (x1 - x0) * scale + 0.1 * space * scale
+
+        width = max(int(np.ceil(x + pad)), 1)
+        canvas = np.full((height, width), 255, dtype=np.uint8)
+        if polylines:
+            cv2.polylines(
+                canvas, [np.rint(p).astype(np.int32) for p in polylines], isClosed=False,
+                color=0, thickness=max(1, int(round(height / 48))), lineType=cv2.LINE_AA
+            )
+        ok, png = cv2.imencode(".png", canvas)
+        if not ok:
+            raise ValueError("Failed to encode preview")
+        return png.tobytes()
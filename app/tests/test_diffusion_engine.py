@@ -0,0 +1,38 @@
+import time
+
+import numpy as np
+import pytest
+
+from app.models.stroke_batch import StrokeBatch
+from app.services.diffusion_engine import QualityEngine, noise_schedule
+
+
+def _line_batch(glyphs=3, points=10):
+    batch = StrokeBatch.from_counts(np.full(glyphs, ord("a")), np.full(glyphs, points))
+    batch.points[:, 0] = np.tile(np.linspace(0, 10, points), glyphs)
+    batch.points[:, 1] = 0
+    batch.pressure[:] = 1
+    return batch
+
+
+def test_noise_schedule_is_cached_and_decreasing():
+    sigmas = noise_schedule(20)
+    assert noise_schedule(20) is sigmas
+    assert sigmas[-1] == 0 and np.all(np.diff(sigmas) < 0)
+
+
+@pytest.mark.asyncio
+async def test_refine_runs_full_budget_and_stays_near_prior():
+    engine = QualityEngine(steps=30, workers=1, deadline_margin_s=0)
+    batch, steps = await engine.refine(_line_batch(), np.random.default_rng(0))
+    assert steps == 30
+    assert np.abs(batch.points[:, 1]).max() < 2.0
+
+
+@pytest.mark.asyncio
+async def test_refine_exits_early_at_deadline():
+    engine = QualityEngine(steps=30, workers=1, deadline_margin_s=1.0)
+    prior = _line_batch()
+    batch, steps = await engine.refine(prior, np.random.default_rng(0), deadline=time.monotonic())
+    assert steps == 0
+    assert np.all(np.isfinite(batch.points))
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from app.services.embedding_index import BruteForceIndex, IVFIndex, build_index, near_duplicates
+
+
+def _catalog(n=2000, dim=64, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    vectors = centers[rng.integers(0, clusters, n)] + 0.3 * rng.standard_normal((n, dim))
+    return [f"p{i}" for i in range(n)], vectors.astype(np.float32)
+
+
+def test_brute_force_is_exact_cosine():
+    ids, vectors = _catalog()
+    index = build_index(ids, vectors, dim=64, backend="brute")
+    query = vectors[:3] + 0.01
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    q = query / np.linalg.norm(query, axis=1, keepdims=True)
+    scores = q @ unit.T
+    expected = np.argsort(-scores, axis=1)[:, :5]
+    results = index.search(query, k=5)
+    for row, exp, best in zip(results, expected, scores.max(axis=1)):
+        assert [ids[j] for j in exp] == [i for i, _ in row]
+        assert row[0][1] == pytest.approx(float(best), abs=1e-4)
+
+
+def test_ivf_recall_and_scores():
+    ids, vectors = _catalog()
+    exact = build_index(ids, vectors, dim=64, backend="brute")
+    ivf = build_index(ids, vectors, dim=64, backend="ivf")
+    assert isinstance(ivf, IVFIndex) and len(ivf) == len(ids)
+    queries = vectors[::50] + 0.05
+    hits = 0
+    for e, a in zip(exact.search(queries, 10), ivf.search(queries, 10)):
+        hits += len({i for i, _ in e} & {i for i, _ in a})
+        assert abs(a[0][1] - e[0][1]) < 0.02
+    assert hits / (10 * len(queries)) > 0.8
+
+
+def test_near_duplicates_and_remove():
+    index = BruteForceIndex(dim=4)
+    index.add(["a", "b", "c"], np.array([[1, 0, 0, 0], [0.99, 0.05, 0, 0], [0, 1, 0, 0]]))
+    assert [i for i, _ in near_duplicates(index, np.array([1, 0, 0, 0]), threshold=0.97)] == ["a", "b"]
+    assert index.remove("a") and len(index) == 2
+    assert [i for i, _ in index.search(np.array([1, 0, 0, 0]), k=5)[0]] == ["b", "c"]
+    assert build_index([], np.zeros((0, 4)), dim=4).search(np.ones(4), 3) == [[]]
+
+
+@pytest.mark.asyncio
+async def test_preset_index_refreshes_in_background(monkeypatch):
+    pytest.importorskip("firebase_admin")
+    from app.api.routes import styles
+    from app.core.embedding_store import embedding_cache, encode_embedding
+    from app.core.mock_db import MockDB
+
+    monkeypatch.setattr(styles, "db", MockDB())
+    monkeypatch.setattr(styles, "_preset_index", {"index": None, "names": {}, "built_at": 0.0, "refresh": None})
+    presets = styles.db.collection("style_presets")
+    rng = np.random.default_rng(0)
+    for i in range(3):
+        presets.document(f"p{i}").set({"is_public": True, "name": f"P{i}", "embedding": encode_embedding(rng.random(512))})
+    embedding_cache.clear()
+
+    index, names = await styles._get_preset_index()
+    assert len(index) == 3 and names["p0"] == "P0"
+    assert len(embedding_cache._entries) == 0
+
+    # once stale, the old index keeps serving while one rebuild runs in the background
+    presets.document("p3").set({"is_public": True, "name": "P3", "embedding": encode_embedding(rng.random(512))})
+    monkeypatch.setattr(styles.settings, "preset_index_refresh_seconds", 0)
+    stale, _ = await styles._get_preset_index()
+    assert stale is index and styles._preset_index["refresh"] is not None
+    await styles._preset_index["refresh"]
+    monkeypatch.setattr(styles.settings, "preset_index_refresh_seconds", 300)
+    fresh, _ = await styles._get_preset_index()
+    assert len(fresh) == 4 and styles._preset_index["refresh"] is None
@@ -0,0 +1,181 @@
+import numpy as np
+import pytest
+
+from app.services.generation_service import GenerationService
+
+
+@pytest.mark.asyncio
+async def test_autoregressive_fills_stroke_batch():
+    service = GenerationService()
+    tokens = await service._tokenize_text("ab c\nd")
+    batch = await service._generate_strokes_autoregressive(tokens, np.zeros(512))
+    assert batch.points.dtype == np.float32
+    assert batch.points.shape == (batch.offsets[-1], 2)
+    assert batch.glyph_count == len(tokens)
+    counts = batch.point_counts()
+    # special tokens own no points, glyphs between 5 and 19
+    assert counts[2] == 0 and counts[4] == 0
+    assert np.all((counts[[0, 1, 3, 5]] >= 5) & (counts[[0, 1, 3, 5]] <= 19))
+
+
+@pytest.mark.asyncio
+async def test_generate_handwriting_dicts_on_request():
+    service = GenerationService()
+    packed = await service.generate_handwriting(np.zeros(512), "hi there")
+    assert "strokes" not in packed["pages"][0]
+    assert packed["stroke_batch"].page_count == packed["page_count"]
+
+    result = await service.generate_handwriting(np.zeros(512), "hi there", include_points=True)
+    strokes = result["pages"][0]["strokes"]
+    assert [s["character"] for s in strokes] == list("hithere")
+    assert set(strokes[0]["points"][0]) == {"x", "y", "pressure"}
+
+
+@pytest.mark.asyncio
+async def test_layout_advances_and_line_breaks():
+    service = GenerationService()
+    tokens = await service._tokenize_text("ab c\nd")
+    batch = await service._generate_strokes_autoregressive(tokens, np.zeros(512))
+    batch.points[:] = 0
+    batch.pressure[:] = 1.0
+    await service._apply_layout_and_style(
+        batch, np.zeros(512), {"pressure_multiplier": 0.5},
+        {"margin_left": 10, "margin_top": 20, "line_height": 30}
+    )
+    starts = batch.points[batch.offsets[[0, 1, 3, 5]]]
+    np.testing.assert_allclose(starts[:, 0], [10, 22, 49, 10])
+    np.testing.assert_allclose(starts[:, 1], [20, 20, 20, 50])
+    assert np.all(batch.pressure == 0.5)
+
+
+@pytest.mark.asyncio
+async def test_paginator_breaks_per_line_and_resets_y():
+    service = GenerationService()
+    page_settings = {"margin_top": 50, "margin_bottom": 50, "line_height": 100, "page_height": 400}
+    # 3 lines fit on a page, so 7 lines span 3 pages
+    result = await service.generate_handwriting(np.zeros(512), "\n".join(["ab"] * 7), page_settings=page_settings)
+    batch = result["stroke_batch"]
+    assert result["page_count"] == 3
+    assert [p["glyph_count"] for p in result["pages"]] == [6, 6, 2]
+    # first points sit on the page's own line tops (plus jitter), not the document's
+    first_y = batch.points[batch.offsets[batch.glyphs_on_page(1)], 1]
+    line_of_point = np.round((first_y - 50) / 100)
+    assert sorted(set(line_of_point.tolist())) == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_page_geometry_from_page_settings_mm():
+    from app.schemas.generation import PageSettings
+
+    geometry = GenerationService()._page_geometry(PageSettings().model_dump())
+    assert (round(geometry["width"]), round(geometry["height"])) == (1240, 1754)
+    assert geometry["line_height"] == pytest.approx(8.0 * 150 / 25.4)
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_one_page_at_a_time():
+    service = GenerationService()
+    page_settings = {"margin_top": 50, "margin_bottom": 50, "line_height": 100, "page_height": 400}
+    text = "\n".join(["ab"] * 7) + "\n\n"
+    pages = [
+        page async for page in service.generate_handwriting_stream(
+            np.zeros(512), text, page_settings=page_settings, include_points=True
+        )
+    ]
+    assert [p["page_number"] for p in pages] == [0, 1, 2]
+    assert [len(p["strokes"]) for p in pages] == [6, 6, 2]
+    assert max(pt["y"] for s in pages[2]["strokes"] for pt in s["points"]) < 400
+
+
+@pytest.mark.asyncio
+async def test_repeated_characters_hit_glyph_cache():
+    from app.models.inference_batcher import get_stroke_batcher
+
+    service = GenerationService()
+    style = np.random.rand(512).astype(np.float32)
+    # the stub generator keeps its own glyph cache entries, so count model requests instead
+    before = get_stroke_batcher().stats()["requests_served"]
+    await service.generate_handwriting(style, "eeee eeee")
+    await service.generate_handwriting(style, "eee")
+    assert get_stroke_batcher().stats()["requests_served"] - before == 1
+
+
+@pytest.mark.asyncio
+async def test_variant_pool_holds_distinct_variants():
+    from app.core.glyph_cache import glyph_cache
+
+    pools = await GenerationService()._generate_variants([ord("e"), ord("f")], np.random.rand(512))
+    for pool in pools.values():
+        assert pool.variant_count == glyph_cache.variants_per_glyph
+        shapes = {pool.points[pool.offsets[v]:pool.offsets[v + 1]].tobytes() for v in range(pool.variant_count)}
+        assert len(shapes) == pool.variant_count
+
+
+@pytest.mark.asyncio
+async def test_concurrent_generations_share_one_model_batch(monkeypatch):
+    import asyncio
+    from app.models import inference_batcher
+    from app.models.inference_batcher import StrokeInferenceBatcher
+    from app.models.stroke_generator import StrokeGenerator
+
+    class CountingGenerator(StrokeGenerator):
+        batch_sizes = []
+
+        def generate_batch(self, token_lists, style_embeddings):
+            self.batch_sizes.append(len(token_lists))
+            return super().generate_batch(token_lists, style_embeddings)
+
+    generator = CountingGenerator()
+    monkeypatch.setattr(inference_batcher, "_stroke_batcher", StrokeInferenceBatcher(generator, window_ms=50))
+    service = GenerationService()
+    first, second = await asyncio.gather(
+        service.generate_handwriting(np.random.rand(512).astype(np.float32), "xy"),
+        service.generate_handwriting(np.random.rand(512).astype(np.float32), "yz"),
+    )
+    assert generator.batch_sizes == [2]
+    assert first["stroke_count"] == second["stroke_count"] == 2
+
+
+def test_glyph_cache_evicts_by_byte_budget():
+    from app.core.glyph_cache import GlyphCache, GlyphVariants
+
+    def pool(n):
+        return GlyphVariants(np.zeros((n, 2), np.float32), np.zeros(n, np.float32), np.array([0, n]))
+
+    cache = GlyphCache(max_bytes=pool(10).nbytes * 2)
+    cache.put("a", pool(10))
+    cache.put("b", pool(10))
+    cache.get("a")
+    cache.put("c", pool(10))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fingerprinted_requests_are_deduplicated_and_reproducible():
+    import asyncio
+    from app.services.generation_service import generation_fingerprint
+
+    service = GenerationService()
+    style = np.random.rand(512).astype(np.float32)
+    fp = generation_fingerprint("style-1:v1", "hello there", {"ink_color": "blue"}, None, "fast")
+    assert fp == generation_fingerprint("style-1:v1", "hello there", {"ink_color": "blue"}, {}, "fast")
+    assert fp != generation_fingerprint("style-1:v2", "hello there", {"ink_color": "blue"}, {}, "fast")
+
+    first, second = await asyncio.gather(
+        service.generate_handwriting(style, "hello there", fingerprint=fp),
+        service.generate_handwriting(style, "hello there", fingerprint=fp),
+    )
+    assert first is second
+    assert service.result_cache_misses == 1
+    again = await service.generate_handwriting(style, "hello there", fingerprint=fp)
+    assert again is first and service.result_cache_hits == 1
+
+    fresh = GenerationService()
+    rerun = await fresh.generate_handwriting(style, "hello there", fingerprint=fp)
+    np.testing.assert_array_equal(rerun["stroke_batch"].points, first["stroke_batch"].points)
+    # another fingerprint seeds different variant picks
+    other_fp = generation_fingerprint("style-1:v2", "hello there", {"ink_color": "blue"}, {}, "fast")
+    other = await fresh.generate_handwriting(style, "hello there", fingerprint=other_fp)
+    assert not np.array_equal(other["stroke_batch"].points, first["stroke_batch"].points)
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from app.models.inference_batcher import StrokeInferenceBatcher
+from app.models.stroke_generator import StrokeGenerator
+
+
+class CountingGenerator(StrokeGenerator):
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    def generate_batch(self, token_lists, style_embeddings):
+        self.batch_sizes.append(len(token_lists))
+        return super().generate_batch(token_lists, style_embeddings)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_batch():
+    generator = CountingGenerator()
+    batcher = StrokeInferenceBatcher(generator, window_ms=20, max_batch_size=8)
+    results = await asyncio.gather(*[
+        batcher.generate([ord("a")] * (i + 1), None) for i in range(5)
+    ])
+    assert generator.batch_sizes == [5]
+    assert [len(r) for r in results] == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_without_waiting():
+    generator = CountingGenerator()
+    batcher = StrokeInferenceBatcher(generator, window_ms=10_000, max_batch_size=2)
+    await asyncio.wait_for(
+        asyncio.gather(batcher.generate([98], None), batcher.generate([99], None)),
+        timeout=1
+    )
+    assert generator.batch_sizes == [2]
@@ -0,0 +1,90 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from app.core.config import settings
+from app.models import registry as registry_module
+from app.models import stroke_generator as stroke_generator_module
+from app.models import style_encoder as style_encoder_module
+from app.models.registry import ModelRegistry
+from app.models.stroke_generator import StrokeGenerator
+from app.models.style_encoder import StyleEncoder
+
+
+class TinyGenerator(torch.nn.Module):
+    def forward(self, tokens: torch.Tensor, style: torch.Tensor) -> torch.Tensor:
+        return tokens.float().sum() + style.sum()
+
+
+class TinyEncoder(torch.nn.Module):
+    def forward(self, images: torch.Tensor) -> torch.Tensor:
+        return images.mean(dim=(1, 2, 3))
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Fresh registry wired into both wrappers, with torch.jit.load counted."""
+    reg = ModelRegistry(device="cpu", num_threads=2)
+    monkeypatch.setattr(stroke_generator_module, "model_registry", reg)
+    monkeypatch.setattr(style_encoder_module, "model_registry", reg)
+    loads = []
+    real_load = torch.jit.load
+
+    def counting_load(path, *args, **kwargs):
+        loads.append(path)
+        return real_load(path, *args, **kwargs)
+
+    monkeypatch.setattr(torch.jit, "load", counting_load)
+    reg.loads = loads
+    return reg
+
+
+@pytest.fixture
+def model_paths(tmp_path):
+    gen_path = str(tmp_path / "generator.pt")
+    enc_path = str(tmp_path / "encoder.pt")
+    torch.jit.script(TinyGenerator()).save(gen_path)
+    torch.jit.script(TinyEncoder()).save(enc_path)
+    return gen_path, enc_path
+
+
+def test_model_file_is_loaded_once_across_wrappers(registry, model_paths):
+    gen_path, enc_path = model_paths
+    generators = [StrokeGenerator(gen_path) for _ in range(3)]
+    encoders = [StyleEncoder(enc_path) for _ in range(3)]
+    assert registry.loads == [gen_path, enc_path]
+    assert all(g.model is generators[0].model for g in generators)
+    assert all(e.model is encoders[0].model for e in encoders)
+    assert generators[0].model is not None
+    assert set(registry.load_times) == {gen_path, enc_path}
+
+
+def test_missing_model_file_is_cached_as_none(registry, tmp_path, monkeypatch):
+    missing = str(tmp_path / "missing.pt")
+    probes = []
+    real_exists = registry_module.os.path.exists
+    monkeypatch.setattr(
+        registry_module.os.path, "exists",
+        lambda p: probes.append(p) or real_exists(p)
+    )
+    assert StrokeGenerator(missing).model is None
+    assert StrokeGenerator(missing).model is None
+    assert probes == [missing]
+    assert registry.loads == []
+
+
+def test_preload_loads_models_and_sets_threads(registry, model_paths, monkeypatch):
+    gen_path, enc_path = model_paths
+    monkeypatch.setattr(settings, "stroke_generator_path", gen_path)
+    monkeypatch.setattr(settings, "style_encoder_path", enc_path)
+    thread_counts = []
+    monkeypatch.setattr(torch, "set_num_threads", thread_counts.append)
+
+    registry.preload()
+    registry.preload()
+
+    assert thread_counts == [2]
+    assert registry.loads == [gen_path, enc_path]
+    assert registry.stroke_generator().model is not None
+    assert registry.style_encoder().model is not None
+    assert registry.stroke_generator() is registry.stroke_generator()
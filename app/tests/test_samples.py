@@ -1,2 +1,72 @@
 def test_dummy():
     assert 2 + 2 == 4
+
+
+def test_process_bytes_matches_file_pipeline(tmp_path):
+    import asyncio
+    import cv2
+    import numpy as np
+    import pytest
+    from app.services.image_processor import ImageProcessor
+
+    page = np.full((300, 400), 235, dtype=np.uint8)
+    cv2.putText(page, "abc", (60, 180), cv2.FONT_HERSHEY_SIMPLEX, 3, 20, 6)
+    ok, buf = cv2.imencode(".png", page)
+    data = buf.tobytes()
+
+    processor = ImageProcessor()
+    in_memory = processor.process_bytes(data)
+    path = tmp_path / "page.png"
+    path.write_bytes(data)
+    on_disk = cv2.imread(asyncio.run(processor.process_image(str(path))), cv2.IMREAD_GRAYSCALE)
+    assert np.array_equal(in_memory, on_disk)
+
+    png = processor.encode_png(in_memory)
+    assert np.array_equal(processor.decode_image(png), in_memory)
+    from app.services.feature_extraction import extract_image_features, extract_sample_features
+    from_array = extract_image_features(processor.decode_image(data))
+    from_file = extract_sample_features(str(path))
+    assert from_array["slant_angle"] == from_file["slant_angle"]
+    assert [s["bbox"] for s in from_array["strokes"]] == [s["bbox"] for s in from_file["strokes"]]
+    with pytest.raises(ValueError):
+        processor.decode_image(b"not an image")
+
+
+def test_upload_keeps_original_when_processed_upload_fails(tmp_path, monkeypatch):
+    import asyncio
+    import io
+    import cv2
+    import numpy as np
+    import pytest
+    pytest.importorskip("firebase_admin")
+    from starlette.datastructures import Headers, UploadFile
+    from app.api.routes import samples
+    from app.core.config import settings
+    from app.core.mock_db import MockBlob, MockBucket, MockDB
+
+    class FailingBlob(MockBlob):
+        def upload_from_string(self, data, content_type=None):
+            raise IOError("storage unavailable")
+
+    class FlakyBucket(MockBucket):
+        def blob(self, path):
+            if path.endswith("_processed.png"):
+                return FailingBlob(path, self)
+            return super().blob(path)
+
+    bucket = FlakyBucket("test")
+    monkeypatch.setattr(samples, "bucket", bucket)
+    monkeypatch.setattr(samples, "db", MockDB())
+    monkeypatch.setattr(settings, "features_dir", str(tmp_path))
+    page = np.full((200, 300), 255, dtype=np.uint8)
+    cv2.line(page, (40, 150), (70, 40), 0, 5)
+    data = cv2.imencode(".png", page)[1].tobytes()
+    upload = UploadFile(io.BytesIO(data), filename="page.png", headers=Headers({"content-type": "image/png"}))
+
+    result = asyncio.run(samples.upload_samples([upload], current_user={"uid": "u1"}))
+    sample_id = result["samples"][0]["id"]
+    doc = samples.db.collection("samples").document(sample_id).get().to_dict()
+    assert doc["storage_path"].startswith("samples/u1/") and doc["storage_path"] in bucket._files
+    assert doc["processed_path"] is None and doc["status"] == "uploaded"
+    # features were extracted from the in-memory page and saved for training
+    assert (tmp_path / f"{sample_id}.npz").exists()
@@ -1,2 +1,271 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+
 def test_style_basics():
     assert isinstance("WriteGen", str)
+
+
+def test_sample_features_merge(tmp_path):
+    import cv2
+    from app.services.feature_extraction import extract_sample_features, merge_sample_features
+
+    img = np.full((200, 200), 255, dtype=np.uint8)
+    # strokes leaning right (top shifted right of the bottom)
+    for x in (40, 100):
+        cv2.line(img, (x, 160), (x + 30, 40), 0, 6)
+    path = str(tmp_path / "sample.png")
+    cv2.imwrite(path, img)
+
+    features = extract_sample_features(path)
+    assert len(features["strokes"]) == 2
+    assert features["slant_angle"] > 5
+    assert abs(features["baseline"] - 163) < 5
+
+    missing = extract_sample_features(str(tmp_path / "missing.png"))
+    merged = merge_sample_features([features, missing], ["a", "b"])
+    assert merged["slant_angle"] == features["slant_angle"]
+    assert [s["sample_id"] for s in merged["strokes"]] == ["a", "b"]
+    assert len(merged["pressure_profiles"]) == 1
+
+
+def test_embedding_round_trip_and_cache():
+    from app.core.embedding_store import EmbeddingCache, decode_embedding, encode_embedding
+
+    emb = np.random.default_rng(0).standard_normal(512).astype(np.float32)
+    f32 = encode_embedding(emb)
+    assert f32.startswith("v1:f32:") and len(f32) < len(emb.tobytes().hex())
+    assert np.array_equal(decode_embedding(f32), emb)
+    f16 = decode_embedding(encode_embedding(emb, "f16"))
+    assert f16.dtype == np.float32 and np.allclose(f16, emb, atol=1e-2)
+    assert np.array_equal(decode_embedding(encode_embedding(emb, as_bytes=True)), emb)
+    # legacy hex values still decode
+    assert np.array_equal(decode_embedding(emb.tobytes().hex()), emb)
+    assert not decode_embedding(None, dim=4).any()
+
+    cache = EmbeddingCache(max_entries=2)
+    first = cache.get("s1", "v1", f32)
+    assert cache.get("s1", "v1", "ignored on a hit") is first
+    assert not first.flags.writeable
+    cache.get("s1", "v2", encode_embedding(emb * 2))
+    cache.get("s2", "v1", f32)
+    assert (cache.hits, cache.misses) == (1, 3)
+    cache.invalidate("s1")
+    assert list(cache._entries) == [("s2", "v1")]
+
+
+@pytest.mark.asyncio
+async def test_style_cache_single_flight_ttl_and_invalidation():
+    import copy
+    import threading
+    from app.core.style_cache import StyleCache
+
+    store = {"s1": {"uid": "u", "name": "one", "parameters": {"slant": 1}}, "s2": {"uid": "u", "name": "two"}}
+    calls = []
+    release = threading.Event()
+
+    def loader(style_id):
+        calls.append(style_id)
+        release.wait(1)
+        return copy.deepcopy(store[style_id]) if style_id in store else None
+
+    cache = StyleCache(ttl_seconds=60, max_entries=1)
+    pending = [asyncio.ensure_future(cache.get("s1", loader)) for _ in range(5)]
+    await asyncio.sleep(0.05)
+    release.set()
+    results = await asyncio.gather(*pending)
+    assert calls == ["s1"] and all(r["name"] == "one" for r in results)
+
+    # hits share the cached dict instead of copying it; writes invalidate
+    assert all(r is results[0] for r in results)
+    assert await cache.get("s1", loader) is results[0]
+    store["s1"]["name"] = "renamed"
+    cache.invalidate("s1")
+    assert (await cache.get("s1", loader))["name"] == "renamed"
+
+    # size bound evicts, missing styles are not cached
+    await cache.get("s2", loader)
+    assert cache.stats()["entries"] == 1
+    assert await cache.get("nope", loader) is None
+    await cache.get("nope", loader)
+    assert calls.count("nope") == 2
+
+    # expired entries reload
+    cache.ttl_seconds = 0
+    cache.invalidate("s2")
+    await cache.get("s2", loader)
+    await cache.get("s2", loader)
+    assert calls.count("s2") == 3
+
+
+@pytest.mark.asyncio
+async def test_retrain_merges_only_new_samples(tmp_path, monkeypatch):
+    import cv2
+    from app.core.config import settings
+    from app.services import feature_extraction
+    from app.services.style_service import StyleService
+
+    monkeypatch.setattr(settings, "features_dir", str(tmp_path))
+    img = np.full((100, 100), 255, dtype=np.uint8)
+    cv2.line(img, (20, 80), (40, 20), 0, 5)
+    cv2.imwrite(str(tmp_path / "new.png"), img)
+
+    service = StyleService()
+    monkeypatch.setattr(service, "_load_samples", lambda ids: asyncio.sleep(0, [
+        {"id": sid, "path": str(tmp_path / f"{sid}.png")} for sid in ids
+    ]))
+    profile = {
+        "sample_count": 3,
+        "feature_stats": {"slant_angle": {"mean": 0.0, "count": 3}},
+        "character_database": {"a": {"variants": [{}, {}, {}], "avg_width": 8.0, "avg_height": 20.0}},
+        "parameters": {"pen_type": "gel"},
+    }
+    extracted = []
+    original = feature_extraction.extract_sample_features
+    monkeypatch.setattr(feature_extraction, "extract_sample_features",
+                        lambda path: extracted.append(path) or original(path))
+
+    result = await service.retrain_style("s1", ["new"], profile=profile)
+    assert result["sample_count"] == 4
+    slant = result["feature_stats"]["slant_angle"]
+    assert slant["count"] == 4 and slant["mean"] == result["parameters"]["slant_angle"] > 0
+    assert result["parameters"]["pen_type"] == "gel"
+    # an untranscribed sample adds no glyphs and leaves the stored ones untouched
+    assert result["character_database"] == profile["character_database"]
+
+    glyph = {"strokes": [{"points": [0, 0, 10, 20]}], "bounding_box": [0, 0, 10, 20]}
+    merged = StyleService._merge_character_database(
+        profile["character_database"],
+        {"a": {"variants": [glyph, {"strokes": []}], "avg_width": 10.0, "avg_height": 20.0}}
+    )
+    assert len(merged["a"]["variants"]) == 4
+    assert merged["a"]["avg_width"] == pytest.approx((8.0 * 3 + 10.0) / 4)
+
+    # the artifact is reused on the next run
+    await service.retrain_style("s1", ["new"], profile=profile)
+    assert len(extracted) == 1 and (tmp_path / "new.npz").exists()
+
+
+@pytest.mark.asyncio
+async def test_character_database_from_aligned_components():
+    from app.services.style_service import StyleService
+
+    # "hi": h is one component, i is a stem plus a dot
+    strokes = [
+        {"points": np.array([[40, 20], [44, 50]], np.float32), "bbox": (40, 20, 46, 50)},
+        {"points": np.array([[10, 20], [28, 50]], np.float32), "bbox": (10, 20, 28, 50)},
+        {"points": np.array([[41, 8], [45, 13]], np.float32), "bbox": (41, 8, 46, 14)},
+    ]
+    features = {"strokes": [{"sample_id": "s", "strokes": strokes}]}
+    char_db = await StyleService()._build_character_database([{"id": "s", "transcription": "hi"}], features)
+    assert set(char_db) == {"h", "i"}
+    i = char_db["i"]["variants"][0]
+    assert len(i["strokes"]) == 2 and i["bounding_box"] == [40, 8, 46, 50]
+    assert char_db["h"]["avg_width"] == 18.0
+
+
+def test_preview_render_and_cache():
+    import cv2
+    from app.core.preview_cache import PreviewCache, DEFAULT_PREVIEW_TEXT
+    from app.services.style_service import StyleService
+
+    stroke = {"points": [0, 0, 10, 20, 20, 0]}
+    style = {"character_database": {
+        "v": {"avg_width": 20.0, "avg_height": 20.0,
+              "variants": [{"strokes": [stroke], "bounding_box": [0, 0, 20, 20]}]}
+    }}
+    png = StyleService().render_preview(style, "vv v", height=64)
+    img = cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_GRAYSCALE)
+    assert img.shape[0] == 64
+    ink_columns = np.flatnonzero((img < 128).any(axis=0))
+    assert len(ink_columns) > img.shape[1] // 2
+    # unknown characters only advance the pen
+    blank = cv2.imdecode(np.frombuffer(StyleService().render_preview(style, "?", height=64), np.uint8), 0)
+    assert (blank == 255).all()
+
+    cache = PreviewCache(max_bytes=2 * len(png), recent_texts=2)
+    assert cache.get("s", "1", "vv v") is None
+    cache.put("s", "1", "vv v", png)
+    assert cache.get("s", "1", "vv v") == png and cache.get("s", "2", "vv v") is None
+    cache.put("s", "1", "a", png)
+    cache.put("s", "1", "b", png)
+    assert cache.current_bytes <= cache.max_bytes and cache.get("s", "1", "vv v") is None
+    cache.get("s", "1", "c")
+    assert cache.texts_to_prerender("s") == [DEFAULT_PREVIEW_TEXT, "c", "vv v"]
+    cache.invalidate("s")
+    assert cache.stats()["entries"] == 0 and cache.current_bytes == 0
+
+
+@pytest.mark.asyncio
+async def test_preview_routes_pin_version_and_prerender(monkeypatch):
+    pytest.importorskip("firebase_admin")
+    from fastapi import HTTPException
+    from app.api.routes import styles
+    from app.core.mock_db import MockDB
+    from app.core.preview_cache import DEFAULT_PREVIEW_TEXT, preview_cache
+    from app.core.style_cache import style_cache
+
+    monkeypatch.setattr(styles, "db", MockDB())
+    style_cache.clear()
+    glyph = {"strokes": [{"points": [0, 0, 10, 20]}], "bounding_box": [0, 0, 10, 20]}
+    doc = {"uid": "u1", "status": "ready", "version": 1,
+           "character_database": {"a": {"avg_width": 10.0, "avg_height": 20.0, "variants": [glyph]}}}
+    styles.db.collection("styles").document("s1").set(doc)
+    user = {"uid": "u1"}
+
+    posted = await styles.preview_style("s1", "aa", current_user=user)
+    assert posted["preview_url"].endswith("text=aa&v=1")
+    pinned = await styles.preview_image("s1", "aa", v="1", current_user=user)
+    assert pinned.media_type == "image/png" and "immutable" in pinned.headers["cache-control"]
+    assert pinned.body == preview_cache.get("s1", "1", "aa")
+
+    with pytest.raises(HTTPException) as too_long:
+        await styles.preview_image("s1", "a" * 65, current_user=user)
+    assert too_long.value.status_code == 400
+
+    # a retrain bumps the version: old URLs stop resolving, new ones are pre-rendered
+    styles.db.collection("styles").document("s1").update({"version": 2})
+    await styles._prerender_previews("s1")
+    with pytest.raises(HTTPException) as stale:
+        await styles.preview_image("s1", "aa", v="1", current_user=user)
+    assert stale.value.status_code == 404
+    for text in (DEFAULT_PREVIEW_TEXT, "aa"):
+        assert preview_cache.get("s1", "2", text) is not None
+
+
+@pytest.mark.asyncio
+async def test_overlapping_retrains_merge_in_turn_and_failures_mark_error(monkeypatch):
+    pytest.importorskip("firebase_admin")
+    from app.api.routes import styles
+    from app.core.mock_db import MockDB
+
+    class FakeService:
+        async def retrain_style(self, style_id, sample_ids, profile):
+            await asyncio.sleep(0.01)
+            if "bad" in sample_ids:
+                raise RuntimeError("extraction failed")
+            return {
+                "embedding": None, "parameters": {}, "feature_stats": {}, "covered_glyphs": [],
+                "character_database": {}, "updated_at": "now",
+                "sample_count": profile.get("sample_count", 0) + len(sample_ids),
+            }
+
+        def render_preview(self, style, text):
+            return b"png"
+
+    monkeypatch.setattr(styles, "db", MockDB())
+    monkeypatch.setattr(styles, "style_service", FakeService())
+    styles.db.collection("styles").document("s1").set({"uid": "u1", "status": "retraining", "sample_count": 1})
+
+    await asyncio.gather(
+        styles._retrain_and_store("s1", ["a"], "completed"),
+        styles._retrain_and_store("s1", ["b", "c"], "retraining"),
+    )
+    doc = styles.db.collection("styles").document("s1").get().to_dict()
+    assert doc["sample_count"] == 4 and doc["version"] == 2 and doc["status"] == "completed"
+
+    await styles._retrain_and_store("s1", ["bad"], "completed")
+    doc = styles.db.collection("styles").document("s1").get().to_dict()
+    assert doc["status"] == "error" and doc["version"] == 2
@@ -0,0 +1,125 @@
+# app/utils/align.py
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# rough advance of a character relative to an average lowercase letter
+NARROW_CHARS = set("iljtfrI1!|.,;:'`\"()[]")
+WIDE_CHARS = set("mwMW@%")
+SPACE_WIDTH = 0.8
+SKIP_COST = 0.5  # per transcript character left without a component (e.g. joined cursive)
+
+
+def reading_order(bboxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sort components top-to-bottom by text line, then left-to-right.
+    A new line starts where the gap between consecutive vertical centres
+    exceeds the median component height (so dots and accents stay on their line).
+    Returns (order, line id of each ordered component).
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    if len(bboxes) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    cy = (bboxes[:, 1] + bboxes[:, 3]) / 2
+    height = np.median(bboxes[:, 3] - bboxes[:, 1])
+    by_y = np.argsort(cy, kind="stable")
+    breaks = np.diff(cy[by_y]) > max(height, 1.0)
+    line_of = np.empty(len(bboxes), dtype=np.int64)
+    line_of[by_y] = np.concatenate(([0], np.cumsum(breaks)))
+    order = np.lexsort((bboxes[:, 0], line_of))
+    return order, line_of[order]
+
+
+def _component_progress(bboxes: np.ndarray, lines: np.ndarray) -> np.ndarray:
+    """Position of each (ordered) component along the concatenated lines, in [0, 1]."""
+    cx = (bboxes[:, 0] + bboxes[:, 2]) / 2
+    starts = np.flatnonzero(np.concatenate(([True], lines[1:] != lines[:-1])))
+    ends = np.concatenate((starts[1:], [len(lines)]))
+    x0 = np.minimum.reduceat(bboxes[:, 0], starts)
+    x1 = np.maximum.reduceat(bboxes[:, 2], starts)
+    extent = np.maximum(x1 - x0, 1.0)
+    # lines are laid end to end, separated by one average glyph width
+    gap = np.median(bboxes[:, 2] - bboxes[:, 0])
+    line_start = np.concatenate(([0.0], np.cumsum(extent + gap)[:-1]))
+    idx = np.repeat(np.arange(len(starts)), ends - starts)
+    pos = line_start[idx] + (cx - x0[idx])
+    total = line_start[-1] + extent[-1]
+    return pos / max(total, 1.0)
+
+
+def _char_progress(transcript: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Transcript indices of the drawable characters and their centre positions in [0, 1]."""
+    widths = np.array([
+        SPACE_WIDTH if ch.isspace() else 0.45 if ch in NARROW_CHARS else 1.4 if ch in WIDE_CHARS else 1.0
+        for ch in transcript
+    ])
+    end = np.cumsum(widths)
+    centre = (end - widths / 2) / max(end[-1], 1e-9) if len(widths) else end
+    drawn = np.array([not ch.isspace() for ch in transcript], dtype=bool)
+    return np.flatnonzero(drawn), centre[drawn]
+
+
+def align_components(
+    bboxes: Sequence, transcript: str, band: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Monotone alignment of connected components to transcript characters.
+    Components are put in reading order and each is assigned to one character;
+    a character can take several components (dots, accents, broken strokes) or
+    none (skipped at SKIP_COST). The DP only visits cells within `band` of the
+    diagonal, so it costs O(n * band) with one vectorized step per component.
+    Returns (order, char_index): component indices in reading order and the
+    transcript index each one is assigned to.
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    order, lines = reading_order(bboxes)
+    char_idx, q = _char_progress(transcript)
+    n, m = len(order), len(char_idx)
+    if n == 0 or m == 0:
+        return order, np.zeros(0, dtype=np.int64)
+    p = _component_progress(bboxes[order], lines)
+    band = band or max(32, abs(n - m) // 2 + 16, int(0.02 * max(n, m)))
+    width = 2 * band + 1
+
+    # row i covers characters lo[i] .. lo[i] + width - 1
+    centre = np.rint(np.arange(n) * (m - 1) / max(n - 1, 1)).astype(np.int64)
+    lo = np.clip(centre - band, 0, max(m - width, 0))
+    cols = np.arange(width)
+    steps = np.arange(3)
+    rel = cols[None, :] - steps[:, None]
+    step_cost = np.array([0.0, 0.0, SKIP_COST])[:, None]
+    # character positions padded so cells past the last character cost inf
+    q_pad = np.concatenate((q, np.full(width, np.inf)))
+    cost = np.empty((n, width))
+    move = np.zeros((n, width), dtype=np.int8)  # characters advanced to reach this cell (0, 1 or 2)
+
+    # previous row with inf padding: 2 cells before, and after for the band shifting right
+    shift = np.diff(lo)
+    prev = np.full(width + 2 + (int(shift.max()) if n > 1 else 0), np.inf)
+    cost[0] = np.abs(p[0] - q_pad[lo[0]:lo[0] + width]) + SKIP_COST * (lo[0] + cols)
+    for i in range(1, n):
+        # candidate predecessors in row i - 1 for advancing 0, 1 or 2 characters
+        prev[2:2 + width] = cost[i - 1]
+        cand = prev[rel + (2 + shift[i - 1])] + step_cost
+        choice = np.argmin(cand, axis=0)
+        move[i] = choice
+        cost[i] = cand[choice, cols] + np.abs(p[i] - q_pad[lo[i]:lo[i] + width])
+
+    # finish on the last character when the band reaches it (remaining ones count as skipped)
+    last_js = lo[n - 1] + cols
+    final = cost[n - 1] + SKIP_COST * np.maximum(m - 1 - last_js, 0)
+    final[last_js >= m] = np.inf
+    w = int(np.argmin(final))
+    assigned = np.empty(n, dtype=np.int64)
+    j = int(lo[n - 1] + w)
+    for i in range(n - 1, -1, -1):
+        assigned[i] = j
+        j -= int(move[i, j - lo[i]])
+    return order, char_idx[assigned]
+
+
+def group_by_character(order: np.ndarray, char_index: np.ndarray, transcript: str) -> List[Tuple[str, List[int]]]:
+    """(character, component indices) for every transcript position that received components."""
+    groups: Dict[int, List[int]] = {}
+    for comp, ci in zip(order.tolist(), char_index.tolist()):
+        groups.setdefault(ci, []).append(comp)
+    return [(transcript[ci], comps) for ci, comps in sorted(groups.items())]
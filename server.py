@@ -7,6 +7,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from app.api.routes import auth, samples, styles, generation, export, dashboard
+from app.core.config import settings
+from app.models.registry import model_registry
 
 app = FastAPI(title="WriteGen - Handwriting API (Firebase)")
 
@@ -25,6 +27,12 @@ app.include_router(generation.router, prefix="/api/generate", tags=["generation"
 app.include_router(export.router, prefix="/api/export", tags=["export"])
 app.include_router(dashboard.router, prefix="/api", tags=["dashboard"])
 
+@app.on_event("startup")
+async def preload_models():
+    # Load and warm up models once so no job pays model-load latency
+    if settings.preload_models:
+        model_registry.preload()
+
 @app.get("/")
 async def root():
     return {"message": "WriteGen API (Firebase)", "version": "1.0.0"}